@@ -0,0 +1,58 @@
+import json
+
+import requests
+
+from moltin_api import add_cart_item, delete_cart_item, get_cart_items
+
+_cart_mirror = None
+
+
+class CartMirror:
+
+    def __init__(self, redis_connection, redis_key='cart_mirror',
+                 ttl=24 * 3600):
+        self.redis = redis_connection
+        self.redis_key = redis_key
+        self.ttl = ttl
+
+    def _save_cart(self, cart_id, cart):
+        self.redis.set(f'{self.redis_key}:{cart_id}', json.dumps(cart),
+                       ex=self.ttl)
+        return cart
+
+    def get_cart(self, moltin_token, cart_id):
+        if cart := self.redis.get(f'{self.redis_key}:{cart_id}'):
+            return json.loads(cart)
+        return self.reconcile(moltin_token, cart_id)
+
+    def reconcile(self, moltin_token, cart_id):
+        cart = get_cart_items(moltin_token, cart_id)
+        return self._save_cart(cart_id, cart)
+
+    def add_item(self, moltin_token, cart_id, product_id, quantity=1):
+        try:
+            cart = add_cart_item(moltin_token, cart_id, product_id,
+                                 item_quantity=quantity)
+        except requests.exceptions.HTTPError:
+            self.invalidate(cart_id)
+            raise
+        return self._save_cart(cart_id, cart)
+
+    def remove_item(self, moltin_token, cart_id, item_id):
+        try:
+            cart = delete_cart_item(moltin_token, cart_id, item_id)
+        except requests.exceptions.HTTPError:
+            self.invalidate(cart_id)
+            return None
+        return self._save_cart(cart_id, cart)
+
+    def invalidate(self, cart_id):
+        self.redis.delete(f'{self.redis_key}:{cart_id}')
+
+
+def get_cart_mirror(redis_connection=None):
+    global _cart_mirror
+
+    if not _cart_mirror:
+        _cart_mirror = CartMirror(redis_connection)
+    return _cart_mirror
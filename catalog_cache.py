@@ -0,0 +1,240 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from moltin_api import (
+    get_included_main_image_urls,
+    get_product,
+    iter_categories,
+    iter_product_pages
+)
+
+logger = logging.getLogger(__file__)
+
+_catalog_cache = None
+
+
+def parse_product(product, image_urls):
+    main_image = product['relationships'].get('main_image')
+    image_id = main_image['data']['id'] if main_image else ''
+    return {
+        'id': product['id'],
+        'name': product['name'],
+        'description': product['description'],
+        'price': product['meta']['display_price']['with_tax']['formatted'],
+        'image_id': image_id,
+        'image_url': image_urls.get(image_id, ''),
+    }
+
+
+def fetch_catalog(moltin_token):
+    products = []
+    for page in iter_product_pages(moltin_token, include_main_image=True):
+        image_urls = get_included_main_image_urls(page)
+        products += [parse_product(product, image_urls)
+                     for product in page['data']]
+    categories = iter_categories(moltin_token)
+    return {
+        'products': products,
+        'categories': [
+            {
+                'id': category['id'],
+                'name': category['name'],
+                'slug': category['slug'],
+            } for category in categories
+        ],
+    }
+
+
+def get_catalog_fingerprint(catalog):
+    return hashlib.sha1(json.dumps(
+        [catalog['products'], catalog['categories']], sort_keys=True
+    ).encode()).hexdigest()
+
+
+class CatalogCache:
+
+    def __init__(self, redis_connection=None, redis_key='catalog', ttl=3600,
+                 version_check_interval=5, lock_timeout=120):
+        self.redis = redis_connection
+        self.redis_key = redis_key
+        self.ttl = ttl
+        self.version_check_interval = version_check_interval
+        self.lock_timeout = lock_timeout
+        self._catalog = None
+        self._products_by_id = {}
+        self._loaded_at = 0
+        self._version_checked_at = 0
+        self._lock = threading.Lock()
+        self._refresh_thread = None
+        self._stop_refresh = threading.Event()
+
+    @property
+    def version(self):
+        return self._catalog['version'] if self._catalog else None
+
+    @property
+    def fingerprint(self):
+        return self._catalog.get('fingerprint') if self._catalog else None
+
+    def _set_catalog(self, catalog):
+        self._catalog = catalog
+        self._products_by_id = {
+            product['id']: product for product in catalog['products']
+        }
+        self._loaded_at = self._version_checked_at = time.time()
+
+    def _get_shared_version(self):
+        if not self.redis:
+            return None
+        return self.redis.get(f'{self.redis_key}:version')
+
+    def _load_shared_catalog(self):
+        if not self.redis:
+            return None
+        serialized_catalog = self.redis.get(self.redis_key)
+        return json.loads(serialized_catalog) if serialized_catalog else None
+
+    def _save_shared_catalog(self, catalog):
+        if not self.redis:
+            return
+        with self.redis.pipeline() as pipe:
+            pipe.set(self.redis_key, json.dumps(catalog), ex=self.ttl)
+            pipe.set(f'{self.redis_key}:version', catalog['version'])
+            pipe.set(f'{self.redis_key}:fingerprint', catalog['fingerprint'])
+            pipe.set(f'{self.redis_key}:refreshed_at', time.time())
+            pipe.execute()
+
+    def _touch_shared_catalog(self):
+        with self.redis.pipeline() as pipe:
+            pipe.expire(self.redis_key, self.ttl)
+            pipe.set(f'{self.redis_key}:refreshed_at', time.time())
+            pipe.execute()
+
+    def _is_stale(self, now):
+        return not self._catalog or now - self._loaded_at > self.ttl
+
+    def _shared_version_changed(self, now):
+        if now - self._version_checked_at < self.version_check_interval:
+            return False
+        self._version_checked_at = now
+        shared_version = self._get_shared_version()
+        return bool(shared_version) and shared_version != self.version
+
+    def refresh(self, moltin_token):
+        catalog = fetch_catalog(moltin_token)
+        catalog['fingerprint'] = get_catalog_fingerprint(catalog)
+        fingerprint = catalog['fingerprint']
+        if not self.redis:
+            if self._catalog and self.fingerprint == fingerprint:
+                self._loaded_at = time.time()
+                return self._catalog
+            catalog['version'] = str(int(time.time() * 1000))
+            self._set_catalog(catalog)
+            logger.info(f'Каталог обновлен, версия {catalog["version"]}')
+            return catalog
+
+        shared_fingerprint = self.redis.get(f'{self.redis_key}:fingerprint')
+        if (shared_fingerprint == fingerprint and
+                self.redis.exists(self.redis_key)):
+            self._touch_shared_catalog()
+            if self.version == self._get_shared_version():
+                self._loaded_at = time.time()
+            elif shared_catalog := self._load_shared_catalog():
+                self._set_catalog(shared_catalog)
+            if self._catalog:
+                return self._catalog
+
+        catalog['version'] = str(
+            self.redis.incr(f'{self.redis_key}:version_counter')
+        )
+        self._save_shared_catalog(catalog)
+        self._set_catalog(catalog)
+        logger.info(f'Каталог обновлен, версия {catalog["version"]}')
+        return catalog
+
+    def _refresh_if_due(self, get_moltin_token, interval):
+        if not self.redis:
+            with self._lock:
+                self.refresh(get_moltin_token())
+            return
+        lock = self.redis.lock(f'{self.redis_key}:refresh_lock',
+                               timeout=self.lock_timeout)
+        if not lock.acquire(blocking=False):
+            return
+        try:
+            refreshed_at = self.redis.get(f'{self.redis_key}:refreshed_at')
+            if refreshed_at and time.time() - float(refreshed_at) < (
+                    interval * 0.9):
+                return
+            with self._lock:
+                self.refresh(get_moltin_token())
+        finally:
+            lock.release()
+
+    def get_catalog(self, moltin_token):
+        now = time.time()
+        if not self._is_stale(now) and not self._shared_version_changed(now):
+            return self._catalog
+        with self._lock:
+            now = time.time()
+            if self._catalog and not self._is_stale(now):
+                if self._catalog['version'] == self._get_shared_version():
+                    return self._catalog
+            if catalog := self._load_shared_catalog():
+                self._set_catalog(catalog)
+                return self._catalog
+            return self.refresh(moltin_token)
+
+    def get_products(self, moltin_token):
+        return self.get_catalog(moltin_token)['products']
+
+    def get_categories(self, moltin_token):
+        return self.get_catalog(moltin_token)['categories']
+
+    def get_product(self, moltin_token, product_id):
+        self.get_catalog(moltin_token)
+        if product := self._products_by_id.get(product_id):
+            return product
+        product = get_product(moltin_token, product_id,
+                              include_main_image=True)
+        return parse_product(product['data'],
+                             get_included_main_image_urls(product))
+
+    def invalidate(self):
+        with self._lock:
+            self._catalog = None
+            self._products_by_id = {}
+            if self.redis:
+                version = self.redis.incr(f'{self.redis_key}:version_counter')
+                with self.redis.pipeline() as pipe:
+                    pipe.delete(self.redis_key,
+                                f'{self.redis_key}:fingerprint')
+                    pipe.set(f'{self.redis_key}:version', version)
+                    pipe.execute()
+
+    def start_background_refresh(self, get_moltin_token, interval=600):
+        def refresh_periodically():
+            while not self._stop_refresh.wait(interval):
+                try:
+                    self._refresh_if_due(get_moltin_token, interval)
+                except Exception as err:
+                    logger.error(f'Не удалось обновить каталог: {err}')
+
+        self._stop_refresh.clear()
+        self._refresh_thread = threading.Thread(target=refresh_periodically,
+                                                daemon=True)
+        self._refresh_thread.start()
+
+    def stop_background_refresh(self):
+        self._stop_refresh.set()
+
+
+def get_catalog_cache(redis_connection=None):
+    global _catalog_cache
+
+    if not _catalog_cache:
+        _catalog_cache = CatalogCache(redis_connection)
+    return _catalog_cache
@@ -1,9 +1,27 @@
 import requests
-from geopy import distance
+
+from restaurant_index import RestaurantIndex, get_restaurants_fingerprint
+
+GEOCODER_URL = 'https://geocode-maps.yandex.ru'
+
+DELIVERY_BANDS = (
+    (0.5, 'nearby'),
+    (5, 'scooter'),
+    (20, 'car'),
+)
+TOO_FAR_BAND = 'too_far'
+
+_restaurant_index = None
+
+
+def set_geocoder_url(url):
+    global GEOCODER_URL
+
+    GEOCODER_URL = url.rstrip('/')
 
 
 def fetch_coordinates(address, yandex_api_key):
-    url = 'https://geocode-maps.yandex.ru/1.x'
+    url = f'{GEOCODER_URL}/1.x'
     apikey = yandex_api_key
     params = {
         'geocode': address,
@@ -25,25 +43,27 @@ def fetch_coordinates(address, yandex_api_key):
     return lon, lat
 
 
+def get_restaurant_index(restaurants):
+    global _restaurant_index
+
+    fingerprint = get_restaurants_fingerprint(restaurants)
+    if not _restaurant_index or _restaurant_index.fingerprint != fingerprint:
+        _restaurant_index = RestaurantIndex(restaurants)
+    return _restaurant_index
+
+
+def get_nearest_restaurants(order_coordinates, restaurants, k=1):
+    return get_restaurant_index(restaurants).nearest(order_coordinates, k=k)
+
+
 def get_nearest_restaurant(order_coordinates, restaurants):
-    distances = []
-    order_lon, order_lat = order_coordinates
-    for restaurant in restaurants:
-        order_distance = distance.distance(
-            (order_lat, order_lon),
-            (restaurant['Latitude'], restaurant['Longitude'])
-        )
-        distances.append(
-            {
-                'address': restaurant['Address'],
-                'lon': restaurant['Longitude'],
-                'lat': restaurant['Latitude'],
-                'id': restaurant['id'],
-                'distance_km': order_distance.kilometers,
-                'distance_m': order_distance.meters,
-                'courier_id': restaurant['Tg-id']
-            }
-        )
-    nearest_restaurant = min(distances,
-                             key=lambda rest: rest['distance_km'])
-    return nearest_restaurant
+    nearest_restaurants = get_nearest_restaurants(order_coordinates,
+                                                  restaurants)
+    return nearest_restaurants[0]
+
+
+def get_delivery_band(distance_km):
+    for max_distance_km, delivery_band in DELIVERY_BANDS:
+        if distance_km < max_distance_km:
+            return delivery_band
+    return TOO_FAR_BAND
@@ -0,0 +1,80 @@
+import numpy as np
+from geopy import distance
+
+from coordinate_utils import DELIVERY_BANDS, TOO_FAR_BAND
+from restaurant_index import EARTH_RADIUS_KM, HAVERSINE_ERROR
+
+BAND_LIMITS = np.array([max_distance for max_distance, _ in DELIVERY_BANDS])
+BAND_NAMES = np.array([band for _, band in DELIVERY_BANDS] + [TOO_FAR_BAND])
+
+
+def get_nearest_by_geodesic(order_lon, order_lat, candidate_indexes,
+                            restaurant_lons, restaurant_lats):
+    return min(
+        (distance.distance(
+            (order_lat, order_lon),
+            (restaurant_lats[restaurant_index],
+             restaurant_lons[restaurant_index])
+        ).kilometers, restaurant_index)
+        for restaurant_index in candidate_indexes
+    )
+
+
+def get_nearest_restaurants_batch(lons, lats, restaurants, chunk_size=4096):
+    order_lons = np.asarray(lons, dtype=np.float64)
+    order_lats = np.asarray(lats, dtype=np.float64)
+    if not restaurants:
+        return {
+            'restaurant_ids': np.full(order_lons.shape[0], None),
+            'courier_ids': np.full(order_lons.shape[0], None),
+            'distances_km': np.full(order_lons.shape[0], np.inf),
+            'delivery_bands': np.full(order_lons.shape[0], TOO_FAR_BAND),
+        }
+    restaurant_ids = np.array([restaurant['id'] for restaurant in restaurants])
+    courier_ids = np.array(
+        [restaurant['Tg-id'] for restaurant in restaurants]
+    )
+    restaurant_lons = np.array(
+        [float(restaurant['Longitude']) for restaurant in restaurants]
+    )
+    restaurant_lats = np.array(
+        [float(restaurant['Latitude']) for restaurant in restaurants]
+    )
+    restaurant_radian_lons = np.radians(restaurant_lons)
+    restaurant_radian_lats = np.radians(restaurant_lats)
+    restaurant_cos_lats = np.cos(restaurant_radian_lats)
+
+    nearest_indexes = np.empty(order_lons.shape[0], dtype=np.intp)
+    distances_km = np.empty(order_lons.shape[0], dtype=np.float64)
+    for start in range(0, order_lons.shape[0], chunk_size):
+        chunk = slice(start, start + chunk_size)
+        chunk_lons = np.radians(order_lons[chunk, np.newaxis])
+        chunk_lats = np.radians(order_lats[chunk, np.newaxis])
+        a = (np.sin((restaurant_radian_lats - chunk_lats) / 2) ** 2 +
+             np.cos(chunk_lats) * restaurant_cos_lats *
+             np.sin((restaurant_radian_lons - chunk_lons) / 2) ** 2)
+        haversine_distances = 2 * EARTH_RADIUS_KM * np.arcsin(
+            np.sqrt(np.clip(a, 0, 1))
+        )
+        max_distances = (haversine_distances.min(axis=1, keepdims=True) *
+                         (1 + 2 * HAVERSINE_ERROR))
+        candidates = haversine_distances <= max_distances
+        for row, row_candidates in enumerate(candidates):
+            order_index = start + row
+            (distances_km[order_index],
+             nearest_indexes[order_index]) = get_nearest_by_geodesic(
+                order_lons[order_index],
+                order_lats[order_index],
+                np.flatnonzero(row_candidates),
+                restaurant_lons,
+                restaurant_lats
+            )
+
+    bands = BAND_NAMES[np.searchsorted(BAND_LIMITS, distances_km,
+                                       side='right')]
+    return {
+        'restaurant_ids': restaurant_ids[nearest_indexes],
+        'courier_ids': courier_ids[nearest_indexes],
+        'distances_km': distances_km,
+        'delivery_bands': bands,
+    }
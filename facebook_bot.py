@@ -5,12 +5,7 @@ from facebook_lib import (
     send_cart_description,
     send_message
 )
-from moltin_api import (
-    get_cart_items,
-    get_or_create_cart,
-    add_cart_item,
-    remove_cart_item
-)
+from cart_mirror import get_cart_mirror
 from moltin_cart_parser import parse_cart
 
 
@@ -60,16 +55,16 @@ def handle_menu(sender_id, redis_data):
         category = user_reply.replace('slug_', '')
         send_menu(sender_id, redis_data, category)
     elif user_reply == 'cart':
-        user_cart = get_cart_items(moltin_token, sender_id)
+        user_cart = get_cart_mirror(redis_data).get_cart(moltin_token,
+                                                         sender_id)
         cart_description = parse_cart(user_cart)
         send_cart_description(sender_id, redis_data, cart_description)
         return 'HANDLE_CART'
     elif user_reply.startswith('product_'):
         product_id = user_reply.replace('product_', '')
-        user_cart = get_or_create_cart(moltin_token, sender_id)
         try:
-            add_cart_item(moltin_token, user_cart['data']['id'],
-                          product_id, item_quantity=1)
+            get_cart_mirror(redis_data).add_item(moltin_token, sender_id,
+                                                 product_id)
         except requests.exceptions.HTTPError:
             message = 'К сожалению, не удалось добавить товар :c'
         else:
@@ -92,23 +87,24 @@ def handle_cart(sender_id, redis_data):
     if user_reply.startswith('add_'):
         product_id = user_reply.replace('add_', '')
         try:
-            add_cart_item(moltin_token, sender_id,
-                          product_id, item_quantity=1)
+            user_cart = get_cart_mirror(redis_data).add_item(
+                moltin_token, sender_id, product_id
+            )
         except requests.exceptions.HTTPError:
             message = 'К сожалению, не удалось добавить товар :c'
             send_message(sender_id, redis_data, message)
         else:
-            user_cart = get_cart_items(moltin_token, sender_id)
             cart_description = parse_cart(user_cart)
             send_cart_description(sender_id, redis_data, cart_description)
     elif user_reply.startswith('delete_'):
         product_id = user_reply.replace('delete_', '')
-        item_removed = remove_cart_item(moltin_token, sender_id, product_id)
-        if not item_removed:
+        user_cart = get_cart_mirror(redis_data).remove_item(
+            moltin_token, sender_id, product_id
+        )
+        if user_cart is None:
             message = 'К сожалению, товар не был удален :c'
             send_message(sender_id, redis_data, message)
             return 'HANDLE_CART'
-        user_cart = get_cart_items(moltin_token, sender_id)
         cart_description = parse_cart(user_cart)
         send_cart_description(sender_id, redis_data, cart_description)
     elif user_reply == 'menu':
@@ -2,6 +2,14 @@ import json
 
 import requests
 
+GRAPH_API_URL = 'https://graph.facebook.com'
+
+
+def set_graph_api_url(url):
+    global GRAPH_API_URL
+
+    GRAPH_API_URL = url.rstrip('/')
+
 
 def send_menu(recipient_id, redis_data, category_slug='main'):
     access_token = redis_data.hget('bot', 'access_token')
@@ -92,7 +100,7 @@ def send_cart_description(recipient_id, redis_data, cart):
 
 
 def send_ring_gallery(recipient_id, access_token, elements):
-    url = "https://graph.facebook.com/v2.6/me/messages"
+    url = f"{GRAPH_API_URL}/v2.6/me/messages"
     params = {"access_token": access_token}
     headers = {"Content-Type": "application/json"}
     request_content = json.dumps({
@@ -115,7 +123,7 @@ def send_ring_gallery(recipient_id, access_token, elements):
 
 
 def send_message(recipient_id, redis_data, message_text):
-    url = "https://graph.facebook.com/v2.6/me/messages"
+    url = f"{GRAPH_API_URL}/v2.6/me/messages"
     access_token = redis_data.hget('bot', 'access_token')
 
     params = {"access_token": access_token}
@@ -1,14 +1,15 @@
 import logging
 import os
-from datetime import datetime
 
 from flask import Flask, request
 from environs import Env
 
 from facebook_bot import handle_users_reply
-from moltin_api import (
-    get_access_token
-)
+from http_cache import DiskCacheBackend, RedisCacheBackend, ResponseCache
+from facebook_lib import set_graph_api_url
+from moltin_api import MOLTIN_API_URL, configure as configure_moltin_client
+from moltin_token import get_token_manager
+from rate_limiter import RateLimiter
 from redis_db import get_redis_connection
 
 logger = logging.getLogger(__file__)
@@ -43,16 +44,9 @@ def webhook():
     redis_connection = get_redis_connection(redis_uri, redis_port,
                                             redis_password)
 
-    current_time = datetime.timestamp(datetime.now())
-    if redis_connection.hget('bot', 'token_expiration') < str(current_time):
-        client_id = env.str('CLIENT_ID')
-        client_secret = env.str('CLIENT_SECRET')
-        moltin_token = get_access_token(client_id, client_secret)
-        redis_connection.hset(
-            'bot',
-            mapping={'moltin_token': moltin_token['access_token'],
-                     'token_expiration': moltin_token['expires']}
-        )
+    client_id = env.str('CLIENT_ID')
+    client_secret = env.str('CLIENT_SECRET')
+    get_token_manager(client_id, client_secret, redis_connection).get_token()
 
     data = request.get_json()
     if data["object"] == "page":
@@ -74,17 +68,30 @@ def main():
     redis_port = env.str('REDIS_PORT')
     redis_password = env.str('REDIS_PASSWORD')
     access_token = env.str('PAGE_ACCESS_TOKEN')
+    moltin_pool_size = env.int('MOLTIN_POOL_SIZE', 10)
+    moltin_timeout = env.float('MOLTIN_TIMEOUT', 15)
+    moltin_rate_limit = env.float('MOLTIN_RATE_LIMIT', 20)
+    moltin_rate_burst = env.int('MOLTIN_RATE_BURST', 40)
+    http_cache_dir = env.str('MOLTIN_HTTP_CACHE_DIR', None)
+    stand_in_url = env.str('API_STAND_IN_URL', None)
+    moltin_api_url = stand_in_url if stand_in_url else MOLTIN_API_URL
+    if stand_in_url:
+        set_graph_api_url(stand_in_url)
 
     redis_connection = get_redis_connection(redis_uri, redis_port,
                                             redis_password)
-
-    moltin_token = get_access_token(client_id, client_secret)
-    mapping = {
-        'access_token': access_token,
-        'moltin_token': moltin_token['access_token'],
-        'token_expiration': moltin_token['expires'],
-    }
-    redis_connection.hset('bot', mapping=mapping)
+    rate_limiter = RateLimiter(redis_connection, rate=moltin_rate_limit,
+                               capacity=moltin_rate_burst)
+    cache_backend = (DiskCacheBackend(http_cache_dir) if http_cache_dir
+                     else RedisCacheBackend(redis_connection))
+    configure_moltin_client(pool_size=moltin_pool_size,
+                            timeout=(3.05, moltin_timeout),
+                            rate_limiter=rate_limiter,
+                            response_cache=ResponseCache(cache_backend),
+                            base_url=moltin_api_url)
+
+    redis_connection.hset('bot', 'access_token', access_token)
+    get_token_manager(client_id, client_secret, redis_connection).get_token()
 
     logger.info('Facebook бот запущен.')
     app.run(debug=True)
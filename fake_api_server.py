@@ -0,0 +1,638 @@
+import argparse
+import hashlib
+import itertools
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import uuid
+
+import requests
+from flask import Flask, Response, jsonify, request
+
+logger = logging.getLogger(__file__)
+app = Flask(__name__)
+
+UPSTREAM_URLS = {
+    'moltin': 'https://api.moltin.com',
+    'graph': 'https://graph.facebook.com',
+    'yandex': 'https://geocode-maps.yandex.ru',
+    'telegram': 'https://api.telegram.org',
+}
+
+SECRET_FIELDS = ('apikey', 'access_token', 'client_secret')
+
+settings = {
+    'mode': 'fake',
+    'latency': 0,
+    'jitter': 0,
+    'error_rate': 0,
+    'throttle_rate': 0,
+    'cassette': 'fake_api_cassette.json',
+}
+cassette = {}
+cassette_lock = threading.Lock()
+store_lock = threading.Lock()
+message_ids = itertools.count(1)
+store = {
+    'products': {},
+    'files': {},
+    'categories': {},
+    'carts': {},
+    'customers': {},
+    'flows': {},
+    'fields': {},
+    'entries': {},
+}
+
+
+def generate_id():
+    return str(uuid.uuid4())
+
+
+def format_price(amount):
+    return f'{amount / 100:.0f}'
+
+
+def seed_store(products_count=40, restaurants_count=20, categories_count=3):
+    categories = []
+    for number in range(categories_count):
+        category_id = generate_id()
+        slug = 'main' if number == 0 else f'category-{number}'
+        categories.append(category_id)
+        store['categories'][category_id] = {
+            'type': 'category',
+            'id': category_id,
+            'name': f'Категория {number}',
+            'slug': slug,
+        }
+    for number in range(products_count):
+        image_id = generate_id()
+        store['files'][image_id] = {
+            'type': 'file',
+            'id': image_id,
+            'link': {'href': f'https://picsum.photos/seed/{number}/600/400'},
+        }
+        add_product({
+            'name': f'Пицца {number}',
+            'slug': f'pizza-{number}',
+            'sku': f'sku-{number}',
+            'description': f'Описание пиццы {number}',
+            'price': [{'amount': random.randint(300, 900) * 100}],
+        }, image_id=image_id, category_id=categories[number % len(categories)])
+
+    store['flows']['Pizzeria'] = []
+    for number in range(restaurants_count):
+        entry_id = generate_id()
+        store['flows']['Pizzeria'].append(entry_id)
+        store['entries'][entry_id] = {
+            'type': 'entry',
+            'id': entry_id,
+            'Address': f'Москва, улица Пиццы, {number + 1}',
+            'Alias': f'Пиццерия {number}',
+            'Longitude': f'{37.4 + random.random() * 0.4:.6f}',
+            'Latitude': f'{55.6 + random.random() * 0.3:.6f}',
+            'Tg-id': str(random.randint(10 ** 8, 10 ** 9)),
+        }
+
+
+def add_product(product, image_id=None, category_id=None):
+    product_id = generate_id()
+    amount = product['price'][0]['amount']
+    relationships = {}
+    if image_id:
+        relationships['main_image'] = {
+            'data': {'type': 'main_image', 'id': image_id}
+        }
+    if category_id:
+        relationships['categories'] = {
+            'data': [{'type': 'category', 'id': category_id}]
+        }
+    store['products'][product_id] = {
+        'type': 'product',
+        'id': product_id,
+        'name': product['name'],
+        'slug': product['slug'],
+        'sku': product['sku'],
+        'description': product['description'],
+        'price': product['price'],
+        'meta': {
+            'display_price': {
+                'with_tax': {
+                    'amount': amount,
+                    'currency': 'RUB',
+                    'formatted': format_price(amount),
+                },
+            },
+        },
+        'relationships': relationships,
+    }
+    return store['products'][product_id]
+
+
+def paginate(items, extra=None):
+    limit = int(request.args.get('page[limit]', 100))
+    offset = int(request.args.get('page[offset]', 0))
+    page_items = items[offset:offset + limit]
+    total_pages = max((len(items) + limit - 1) // limit, 1)
+    next_page_url = None
+    if offset + limit < len(items):
+        query = request.args.to_dict()
+        query['page[offset]'] = offset + limit
+        next_page_url = requests.Request(
+            'GET', request.base_url, params=query
+        ).prepare().url
+    response = {
+        'data': page_items,
+        'links': {'next': next_page_url},
+        'meta': {
+            'page': {
+                'limit': limit,
+                'offset': offset,
+                'current': offset // limit + 1,
+                'total': total_pages,
+            },
+            'results': {'total': len(items)},
+        },
+    }
+    if extra:
+        response.update(extra)
+    return response
+
+
+def get_filter_values(operator, field):
+    query_filter = request.args.get('filter', '')
+    if match := re.search(rf'{operator}\({re.escape(field)},\s*([^)]*)\)',
+                          query_filter):
+        return [value.strip() for value in match.group(1).split(',')]
+    return None
+
+
+def get_included_images(products):
+    if request.args.get('include') != 'main_image':
+        return None
+    image_ids = {
+        main_image['data']['id'] for product in products
+        if (main_image := product['relationships'].get('main_image'))
+    }
+    return {
+        'included': {
+            'main_images': [store['files'][image_id]
+                            for image_id in image_ids
+                            if image_id in store['files']]
+        }
+    }
+
+
+def get_cart_response(cart_id):
+    items = store['carts'].setdefault(cart_id, [])
+    total = sum(item['unit_amount'] * item['quantity'] for item in items)
+    data = []
+    for item in items:
+        value = item['unit_amount'] * item['quantity']
+        cart_item = {
+            'type': 'cart_item',
+            'id': item['id'],
+            'product_id': item['product_id'],
+            'name': item['name'],
+            'description': item['description'],
+            'quantity': item['quantity'],
+            'meta': {
+                'display_price': {
+                    'with_tax': {
+                        'unit': {'formatted': format_price(
+                            item['unit_amount']
+                        )},
+                        'value': {'formatted': format_price(value)},
+                    },
+                },
+            },
+        }
+        if item.get('image_url'):
+            cart_item['image'] = {'href': item['image_url']}
+        data.append(cart_item)
+    return {
+        'data': data,
+        'meta': {
+            'display_price': {
+                'with_tax': {'amount': total,
+                             'formatted': format_price(total)},
+            },
+        },
+    }
+
+
+def not_found():
+    return jsonify({'errors': [{'status': 404, 'title': 'Not Found'}]}), 404
+
+
+@app.route('/oauth/access_token', methods=['POST'])
+def access_token():
+    return jsonify({
+        'access_token': uuid.uuid4().hex,
+        'token_type': 'Bearer',
+        'expires_in': 3600,
+        'expires': int(time.time()) + 3600,
+    })
+
+
+@app.route('/v2/products', methods=['GET', 'POST'])
+def products():
+    if request.method == 'POST':
+        with store_lock:
+            product = add_product(request.get_json()['data'])
+        return jsonify({'data': product}), 201
+    products = list(store['products'].values())
+    if category_ids := get_filter_values('eq', 'category.id'):
+        products = [
+            product for product in products
+            if any(category['id'] in category_ids for category in
+                   product['relationships'].get('categories', {}).get(
+                       'data', []))
+        ]
+    response = paginate(products)
+    response.update(get_included_images(response['data']) or {})
+    return jsonify(response)
+
+
+@app.route('/v2/products/<product_id>', methods=['GET', 'DELETE'])
+def product(product_id):
+    if request.method == 'DELETE':
+        store['products'].pop(product_id, None)
+        return '', 204
+    if not (product := store['products'].get(product_id)):
+        return not_found()
+    response = {'data': product}
+    response.update(get_included_images([product]) or {})
+    return jsonify(response)
+
+
+@app.route('/v2/products/<product_id>/relationships/main-image',
+           methods=['POST'])
+def product_main_image(product_id):
+    if not (product := store['products'].get(product_id)):
+        return not_found()
+    image = request.get_json()['data']
+    product['relationships']['main_image'] = {'data': image}
+    return jsonify({'data': image})
+
+
+@app.route('/v2/files', methods=['GET', 'POST'])
+def files():
+    if request.method == 'POST':
+        file_id = generate_id()
+        store['files'][file_id] = {
+            'type': 'file',
+            'id': file_id,
+            'link': {'href': request.form.get('file_location', '')},
+        }
+        return jsonify({'data': store['files'][file_id]}), 201
+    files = list(store['files'].values())
+    if file_ids := get_filter_values('in', 'id'):
+        files = [file for file in files if file['id'] in file_ids]
+    return jsonify(paginate(files))
+
+
+@app.route('/v2/files/<file_id>')
+def file(file_id):
+    if not (file := store['files'].get(file_id)):
+        return not_found()
+    return jsonify({'data': file})
+
+
+@app.route('/v2/carts/<cart_id>', methods=['GET', 'DELETE'])
+def cart(cart_id):
+    if request.method == 'DELETE':
+        store['carts'].pop(cart_id, None)
+        return '', 204
+    store['carts'].setdefault(cart_id, [])
+    return jsonify({'data': {'type': 'cart', 'id': cart_id}})
+
+
+@app.route('/v2/carts/<cart_id>/items', methods=['GET', 'POST'])
+def cart_items(cart_id):
+    if request.method == 'POST':
+        cart_item = request.get_json()['data']
+        if not (product := store['products'].get(cart_item['id'])):
+            return not_found()
+        with store_lock:
+            items = store['carts'].setdefault(cart_id, [])
+            for item in items:
+                if item['product_id'] == product['id']:
+                    item['quantity'] += cart_item['quantity']
+                    break
+            else:
+                main_image = product['relationships'].get('main_image')
+                image = (store['files'].get(main_image['data']['id'])
+                         if main_image else None)
+                items.append({
+                    'id': generate_id(),
+                    'product_id': product['id'],
+                    'name': product['name'],
+                    'description': product['description'],
+                    'quantity': cart_item['quantity'],
+                    'unit_amount': product['price'][0]['amount'],
+                    'image_url': image['link']['href'] if image else None,
+                })
+        return jsonify(get_cart_response(cart_id)), 201
+    return jsonify(get_cart_response(cart_id))
+
+
+@app.route('/v2/carts/<cart_id>/items/<item_id>', methods=['DELETE'])
+def cart_item(cart_id, item_id):
+    with store_lock:
+        items = store['carts'].setdefault(cart_id, [])
+        store['carts'][cart_id] = [
+            item for item in items if item['id'] != item_id
+        ]
+    return jsonify(get_cart_response(cart_id))
+
+
+@app.route('/v2/customers', methods=['POST'])
+def customers():
+    customer = dict(request.get_json()['data'], id=generate_id())
+    store['customers'][customer['id']] = customer
+    return jsonify({'data': customer}), 201
+
+
+@app.route('/v2/customers/<customer_id>')
+def customer(customer_id):
+    if not (customer := store['customers'].get(customer_id)):
+        return not_found()
+    return jsonify({'data': customer})
+
+
+@app.route('/v2/flows', methods=['POST'])
+def flows():
+    flow = dict(request.get_json()['data'], id=generate_id())
+    store['flows'].setdefault(flow['slug'], [])
+    return jsonify({'data': flow}), 201
+
+
+@app.route('/v2/fields', methods=['POST'])
+def fields():
+    field = dict(request.get_json()['data'], id=generate_id())
+    store['fields'][field['id']] = field
+    return jsonify({'data': field}), 201
+
+
+@app.route('/v2/flows/<flow_slug>/entries', methods=['GET', 'POST'])
+def flow_entries(flow_slug):
+    entry_ids = store['flows'].setdefault(flow_slug, [])
+    if request.method == 'POST':
+        entry = dict(request.get_json()['data'], id=generate_id())
+        with store_lock:
+            store['entries'][entry['id']] = entry
+            entry_ids.append(entry['id'])
+        return jsonify({'data': entry}), 201
+    return jsonify(paginate([store['entries'][entry_id]
+                             for entry_id in entry_ids]))
+
+
+@app.route('/v2/categories')
+def categories():
+    categories = list(store['categories'].values())
+    if slugs := get_filter_values('eq', 'slug'):
+        categories = [category for category in categories
+                      if category['slug'] in slugs]
+    return jsonify(paginate(categories))
+
+
+@app.route('/v2.6/me/messages', methods=['POST'])
+def graph_messages():
+    recipient_id = request.get_json(force=True)['recipient']['id']
+    return jsonify({
+        'recipient_id': recipient_id,
+        'message_id': f'm_{uuid.uuid4().hex}',
+    })
+
+
+@app.route('/1.x')
+def geocode():
+    address = request.args.get('geocode', '')
+    if not address.strip():
+        members = []
+    else:
+        seed = random.Random(address)
+        lon = 37.4 + seed.random() * 0.4
+        lat = 55.6 + seed.random() * 0.3
+        members = [{'GeoObject': {'Point': {'pos': f'{lon:.6f} {lat:.6f}'}}}]
+    return jsonify({
+        'response': {
+            'GeoObjectCollection': {'featureMember': members},
+        },
+    })
+
+
+def get_telegram_message(chat_id, **fields):
+    return {
+        'message_id': next(message_ids),
+        'date': int(time.time()),
+        'chat': {'id': int(chat_id), 'type': 'private'},
+        **fields,
+    }
+
+
+@app.route('/bot<token>/<method>', methods=['GET', 'POST'])
+def telegram(token, method):
+    params = request.values.to_dict()
+    if request.is_json:
+        params.update(request.get_json())
+    chat_id = params.get('chat_id', 1)
+    method = method.lower()
+
+    if method == 'getme':
+        result = {'id': 1, 'is_bot': True, 'first_name': 'Fake',
+                  'username': 'fake_bot'}
+    elif method == 'getupdates':
+        time.sleep(min(float(params.get('timeout', 0)), 1))
+        result = []
+    elif method in ('sendmessage', 'editmessagetext'):
+        result = get_telegram_message(chat_id, text=params.get('text', ''))
+    elif method == 'sendphoto':
+        photo = params.get('photo')
+        if not isinstance(photo, str) or photo.startswith('http'):
+            photo = f'fake-file-{uuid.uuid4().hex}'
+        result = get_telegram_message(chat_id, photo=[{
+            'file_id': photo,
+            'file_unique_id': photo[-16:],
+            'width': 600,
+            'height': 400,
+        }])
+    elif method == 'sendlocation':
+        result = get_telegram_message(chat_id, location={
+            'latitude': float(params.get('latitude', 0)),
+            'longitude': float(params.get('longitude', 0)),
+        })
+    elif method == 'sendinvoice':
+        result = get_telegram_message(chat_id)
+    else:
+        result = True
+    return jsonify({'ok': True, 'result': result})
+
+
+def get_upstream(path):
+    if path.startswith('/bot'):
+        return UPSTREAM_URLS['telegram']
+    if path.startswith('/v2.6/'):
+        return UPSTREAM_URLS['graph']
+    if path.startswith('/1.x'):
+        return UPSTREAM_URLS['yandex']
+    return UPSTREAM_URLS['moltin']
+
+
+def get_body_digest():
+    raw_body = request.get_data()
+    if not raw_body:
+        return ''
+    if request.is_json:
+        try:
+            body = json.loads(raw_body)
+        except ValueError:
+            body = raw_body.decode(errors='replace')
+    elif request.form or request.files:
+        body = sorted(
+            (key, value) for key, value in request.form.items(multi=True)
+            if key not in SECRET_FIELDS
+        ) + sorted(
+            (key, hashlib.sha1(file.read()).hexdigest())
+            for key, file in request.files.items(multi=True)
+        )
+    else:
+        body = raw_body.decode(errors='replace')
+    return hashlib.sha1(
+        json.dumps(body, sort_keys=True, ensure_ascii=False).encode()
+    ).hexdigest()
+
+
+def get_cassette_key():
+    query = sorted(
+        (key, value) for key, value in request.args.items(multi=True)
+        if key not in SECRET_FIELDS
+    )
+    path = re.sub(r'^/bot[^/]+', '/bot<token>', request.path)
+    return (f'{request.method} {path} {json.dumps(query)} '
+            f'{get_body_digest()}')
+
+
+def redact_response_body(body):
+    if request.path != '/oauth/access_token':
+        return body
+    try:
+        token = json.loads(body)
+    except ValueError:
+        return body
+    for key in ('access_token', 'refresh_token'):
+        if key in token:
+            token[key] = 'redacted'
+    return json.dumps(token)
+
+
+def save_cassette():
+    temp_path = f'{settings["cassette"]}.tmp'
+    with open(temp_path, 'w') as file:
+        json.dump(cassette, file, ensure_ascii=False, indent=2)
+    os.replace(temp_path, settings['cassette'])
+
+
+def record_response():
+    headers = {
+        key: value for key, value in request.headers.items()
+        if key.lower() not in ('host', 'content-length')
+    }
+    upstream_response = requests.request(
+        request.method,
+        f'{get_upstream(request.path)}{request.full_path.rstrip("?")}',
+        headers=headers,
+        data=request.get_data(),
+        timeout=30,
+    )
+    with cassette_lock:
+        cassette[get_cassette_key()] = {
+            'status': upstream_response.status_code,
+            'content_type': upstream_response.headers.get('Content-Type'),
+            'body': redact_response_body(upstream_response.text),
+        }
+        save_cassette()
+    return Response(upstream_response.content,
+                    status=upstream_response.status_code,
+                    content_type=upstream_response.headers.get(
+                        'Content-Type'
+                    ))
+
+
+@app.before_request
+def simulate_network():
+    delay = settings['latency'] + random.random() * settings['jitter']
+    if delay:
+        time.sleep(delay)
+
+    if random.random() < settings['throttle_rate']:
+        response = jsonify({'errors': [{'status': 429,
+                                        'title': 'Too Many Requests'}]})
+        response.status_code = 429
+        response.headers['Retry-After'] = '1'
+        return response
+    if random.random() < settings['error_rate']:
+        return jsonify({'errors': [{'status': 500,
+                                    'title': 'Internal Server Error'}]}), 500
+
+    if settings['mode'] == 'record':
+        return record_response()
+    if settings['mode'] == 'replay':
+        if recorded := cassette.get(get_cassette_key()):
+            return Response(recorded['body'], status=recorded['status'],
+                            content_type=recorded['content_type'])
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description='Локальная замена API Moltin, Telegram, Facebook и '
+                    'Яндекс-геокодера для нагрузочного тестирования'
+    )
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--mode', choices=('fake', 'record', 'replay'),
+                        default='fake',
+                        help='fake - ответы генерируются, record - запросы '
+                             'проксируются в настоящие API и записываются, '
+                             'replay - проигрываются записанные ответы')
+    parser.add_argument('--cassette', default=settings['cassette'],
+                        help='файл с записанными ответами')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='задержка каждого ответа в секундах')
+    parser.add_argument('--jitter', type=float, default=0,
+                        help='случайная добавка к задержке в секундах')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='доля ответов с ошибкой 500')
+    parser.add_argument('--throttle-rate', type=float, default=0,
+                        help='доля ответов с ошибкой 429')
+    parser.add_argument('--products', type=int, default=40)
+    parser.add_argument('--restaurants', type=int, default=20)
+    args = parser.parse_args()
+
+    settings.update({
+        'mode': args.mode,
+        'cassette': args.cassette,
+        'latency': args.latency,
+        'jitter': args.jitter,
+        'error_rate': args.error_rate,
+        'throttle_rate': args.throttle_rate,
+    })
+    if args.mode == 'replay' and os.path.exists(args.cassette):
+        with open(args.cassette, 'r') as file:
+            cassette.update(json.load(file))
+    seed_store(products_count=args.products,
+               restaurants_count=args.restaurants)
+
+    logger.info(f'Тестовый сервер API запущен в режиме {args.mode}')
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
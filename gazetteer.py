@@ -0,0 +1,224 @@
+import argparse
+import logging
+import mmap
+import os
+import re
+from array import array
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+
+from geocode_cache import normalize_address
+
+logger = logging.getLogger(__file__)
+
+_gazetteer = None
+
+
+def get_ngrams(text, size=3):
+    padded_text = f' {text} '
+    return {padded_text[start:start + size]
+            for start in range(len(padded_text) - size + 1)}
+
+
+def get_house_numbers(address_key):
+    return ' '.join(re.findall(r'\d+', address_key))
+
+
+def build_gazetteer(source_path, index_path):
+    records = {}
+    with open(source_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            try:
+                address, lon, lat = line.rstrip('\n').split('\t')
+                float(lon), float(lat)
+            except ValueError:
+                continue
+            if address_key := normalize_address(address):
+                records[address_key] = (lon, lat)
+
+    with open(index_path, 'w', encoding='utf-8') as file:
+        for address_key in sorted(records, key=lambda key: key.encode()):
+            lon, lat = records[address_key]
+            file.write(f'{address_key}\t{lon}\t{lat}\n')
+    return len(records)
+
+
+class Gazetteer:
+
+    def __init__(self, index_path, min_similarity=0.8, max_token_lines=1000,
+                 max_candidates=50):
+        self.index_path = index_path
+        self.min_similarity = min_similarity
+        self.max_token_lines = max_token_lines
+        self.max_candidates = max_candidates
+        self._offsets = array('Q')
+        self._common_tokens = set()
+        self._streets = []
+        self._street_houses = []
+        self._ngrams = defaultdict(lambda: array('I'))
+        self._file = open(index_path, 'rb')
+        self._data = b''
+        if os.path.getsize(index_path):
+            self._data = mmap.mmap(self._file.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+            self._load_offsets()
+            self._load_streets()
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def _load_offsets(self):
+        offset = 0
+        size = len(self._data)
+        while offset < size:
+            self._offsets.append(offset)
+            line_end = self._data.find(b'\n', offset)
+            offset = size if line_end == -1 else line_end + 1
+
+    def _load_streets(self):
+        address_keys = [
+            self._read_key(line_number).decode()
+            for line_number in range(len(self._offsets))
+        ]
+        token_lines = Counter(
+            token for address_key in address_keys
+            for token in set(address_key.split())
+        )
+        self._common_tokens = {
+            token for token, lines_count in token_lines.items()
+            if lines_count > self.max_token_lines and not token.isdigit()
+        }
+
+        street_ids = {}
+        for line_number, address_key in enumerate(address_keys):
+            street = self._get_street(address_key)
+            if street not in street_ids:
+                street_ids[street] = len(self._streets)
+                self._streets.append(street)
+                self._street_houses.append({})
+                for ngram in get_ngrams(street):
+                    self._ngrams[ngram].append(street_ids[street])
+            street_houses = self._street_houses[street_ids[street]]
+            street_houses.setdefault(get_house_numbers(address_key),
+                                     line_number)
+
+    def _get_street(self, address_key):
+        return ' '.join(
+            token for token in address_key.split()
+            if token not in self._common_tokens and
+            not any(char.isdigit() for char in token)
+        )
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+    def _read_key(self, line_number):
+        offset = self._offsets[line_number]
+        return self._data[offset:self._data.find(b'\t', offset)]
+
+    def _read_coordinates(self, line_number):
+        offset = self._offsets[line_number]
+        line_end = self._data.find(b'\n', offset)
+        line = self._data[offset:line_end if line_end != -1 else None]
+        _, lon, lat = line.decode().split('\t')
+        return lon, lat
+
+    def _bisect(self, key):
+        low, high = 0, len(self._offsets)
+        while low < high:
+            middle = (low + high) // 2
+            if self._read_key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def find_exact(self, address_key):
+        key = address_key.encode()
+        line_number = self._bisect(key)
+        if (line_number < len(self._offsets) and
+                self._read_key(line_number) == key):
+            return self._read_coordinates(line_number)
+        return None
+
+    def find_by_prefix(self, address_key, limit=10):
+        key = address_key.encode()
+        line_number = self._bisect(key)
+        matches = []
+        while (line_number < len(self._offsets) and len(matches) < limit and
+               self._read_key(line_number).startswith(key)):
+            matches.append((self._read_key(line_number).decode(),
+                            self._read_coordinates(line_number)))
+            line_number += 1
+        return matches
+
+    def find_similar(self, address_key):
+        street = self._get_street(address_key)
+        if not street:
+            return None
+        overlaps = Counter()
+        for ngram in get_ngrams(street):
+            overlaps.update(self._ngrams.get(ngram, ()))
+
+        house_numbers = get_house_numbers(address_key)
+        best_similarity = 0
+        best_line_numbers = []
+        for street_id, _ in overlaps.most_common(self.max_candidates):
+            line_number = self._street_houses[street_id].get(house_numbers)
+            if line_number is None:
+                continue
+            similarity = SequenceMatcher(None, street,
+                                         self._streets[street_id]).ratio()
+            if similarity > best_similarity:
+                best_similarity = similarity
+                best_line_numbers = [line_number]
+            elif similarity == best_similarity:
+                best_line_numbers.append(line_number)
+        if (best_similarity < self.min_similarity or
+                len(best_line_numbers) != 1):
+            return None
+        return self._read_coordinates(best_line_numbers[0])
+
+    def lookup(self, address):
+        address_key = normalize_address(address)
+        if not address_key or not self._offsets:
+            return None
+        if coordinates := self.find_exact(address_key):
+            return coordinates
+        prefix_matches = self.find_by_prefix(f'{address_key} ', limit=2)
+        if len(prefix_matches) == 1:
+            return prefix_matches[0][1]
+        return self.find_similar(address_key)
+
+
+def load_gazetteer(index_path):
+    global _gazetteer
+
+    _gazetteer = Gazetteer(index_path)
+    logger.info(f'Загружен справочник адресов: {len(_gazetteer)} записей')
+    return _gazetteer
+
+
+def get_gazetteer():
+    return _gazetteer
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description='Сборка локального справочника адресов. Исходный файл - '
+                    'строки вида "адрес<TAB>долгота<TAB>широта"'
+    )
+    parser.add_argument('source_path', help='исходный TSV файл с адресами')
+    parser.add_argument('index_path', help='куда сохранить справочник')
+    args = parser.parse_args()
+
+    records_count = build_gazetteer(args.source_path, args.index_path)
+    logger.info(f'Справочник собран: {records_count} адресов')
+
+
+if __name__ == '__main__':
+    main()
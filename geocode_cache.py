@@ -0,0 +1,106 @@
+import re
+
+from cache_utils import CacheStats, LRUCache
+from coordinate_utils import fetch_coordinates
+
+ADDRESS_ABBREVIATIONS = {
+    'г': 'город',
+    'ул': 'улица',
+    'пр': 'проспект',
+    'пр-т': 'проспект',
+    'просп': 'проспект',
+    'пер': 'переулок',
+    'ш': 'шоссе',
+    'пл': 'площадь',
+    'наб': 'набережная',
+    'б-р': 'бульвар',
+    'бул': 'бульвар',
+    'д': 'дом',
+    'к': 'корпус',
+    'корп': 'корпус',
+    'стр': 'строение',
+    'кв': 'квартира',
+}
+NOT_FOUND = ''
+
+_geocode_cache = None
+
+
+def normalize_address(address):
+    address = address.lower().replace('ё', 'е')
+    address = re.sub(r'[^\w\s-]', ' ', address)
+    words = [
+        ADDRESS_ABBREVIATIONS.get(word, word)
+        for word in address.split()
+    ]
+    return ' '.join(word for word in words if word.strip('-'))
+
+
+class GeocodeCache:
+
+    def __init__(self, redis_connection=None, redis_key='geocode',
+                 ttl=30 * 24 * 3600, negative_ttl=24 * 3600, maxsize=4096):
+        self.redis = redis_connection
+        self.redis_key = redis_key
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.coordinates = LRUCache(maxsize)
+        self.stats = CacheStats()
+        self.negative_hits = 0
+
+    @staticmethod
+    def _parse(cached_coordinates):
+        if cached_coordinates == NOT_FOUND:
+            return None
+        lon, lat = cached_coordinates.split(' ')
+        return lon, lat
+
+    def _get_cached(self, address_key):
+        cached_coordinates = self.coordinates.get(address_key)
+        if cached_coordinates is None and self.redis:
+            cached_coordinates = self.redis.get(
+                f'{self.redis_key}:{address_key}'
+            )
+            if cached_coordinates is not None:
+                self.coordinates.set(address_key, cached_coordinates)
+        return cached_coordinates
+
+    def _set_cached(self, address_key, coordinates):
+        cached_coordinates = ' '.join(coordinates) if coordinates \
+            else NOT_FOUND
+        self.coordinates.set(address_key, cached_coordinates)
+        if self.redis:
+            self.redis.set(f'{self.redis_key}:{address_key}',
+                           cached_coordinates,
+                           ex=self.ttl if coordinates else self.negative_ttl)
+
+    def get_coordinates(self, address, yandex_api_key):
+        address_key = normalize_address(address)
+        if not address_key:
+            return None
+        cached_coordinates = self._get_cached(address_key)
+        if cached_coordinates is not None:
+            self.stats.hit()
+            if cached_coordinates == NOT_FOUND:
+                self.negative_hits += 1
+            return self._parse(cached_coordinates)
+
+        self.stats.miss()
+        coordinates = fetch_coordinates(address, yandex_api_key)
+        self._set_cached(address_key, coordinates)
+        return coordinates
+
+    def get_metrics(self):
+        return {
+            **self.stats.as_dict(),
+            'negative_hits': self.negative_hits,
+            'cached_in_memory': len(self.coordinates),
+        }
+
+
+def get_geocode_cache(redis_connection=None):
+    global _geocode_cache
+
+    if not _geocode_cache:
+        _geocode_cache = GeocodeCache(redis_connection)
+    return _geocode_cache
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+from urllib.parse import urlencode
+
+from cache_utils import CacheStats, LRUCache
+
+
+class RedisCacheBackend:
+
+    def __init__(self, redis_connection, redis_key='http_cache',
+                 ttl=24 * 3600):
+        self.redis = redis_connection
+        self.redis_key = redis_key
+        self.ttl = ttl
+
+    def get(self, key):
+        if cached_response := self.redis.get(f'{self.redis_key}:{key}'):
+            return json.loads(cached_response)
+
+    def set(self, key, cached_response):
+        self.redis.set(f'{self.redis_key}:{key}', json.dumps(cached_response),
+                       ex=self.ttl)
+
+    def touch(self, key):
+        self.redis.expire(f'{self.redis_key}:{key}', self.ttl)
+
+
+class DiskCacheBackend:
+
+    def __init__(self, directory='.http_cache'):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _get_path(self, key):
+        return os.path.join(self.directory, f'{key}.json')
+
+    def get(self, key):
+        try:
+            with open(self._get_path(key), 'r') as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def set(self, key, cached_response):
+        path = self._get_path(key)
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump(cached_response, file)
+        os.replace(temp_path, path)
+
+    def touch(self, key):
+        pass
+
+
+class ResponseCache:
+
+    cacheable_paths = (
+        '/v2/products',
+        '/v2/categories',
+        '/v2/flows',
+        '/v2/files',
+    )
+
+    def __init__(self, backend, maxsize=256):
+        self.backend = backend
+        self.decoded = LRUCache(maxsize)
+        self.stats = CacheStats()
+
+    def is_cacheable(self, path):
+        return any(cacheable_path in path
+                   for cacheable_path in self.cacheable_paths)
+
+    @staticmethod
+    def make_key(url, params=None):
+        if params:
+            url = f'{url}?{urlencode(sorted(params.items()))}'
+        return hashlib.sha1(url.encode()).hexdigest()
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def get_validators(self, cached_response):
+        headers = {}
+        if not cached_response:
+            return headers
+        if etag := cached_response.get('etag'):
+            headers['If-None-Match'] = etag
+        if last_modified := cached_response.get('last_modified'):
+            headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def load_body(self, key, cached_response):
+        self.stats.hit()
+        self.backend.touch(key)
+        decoded = self.decoded.get(key)
+        if decoded and decoded[0] == cached_response['body_hash']:
+            return decoded[1]
+        body = json.loads(cached_response['body'])
+        self.decoded.set(key, (cached_response['body_hash'], body))
+        return body
+
+    def store(self, key, response):
+        self.stats.miss()
+        body = response.json()
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return body
+        body_hash = hashlib.sha1(response.content).hexdigest()
+        self.backend.set(key, {
+            'etag': etag,
+            'last_modified': last_modified,
+            'body': response.text,
+            'body_hash': body_hash,
+        })
+        self.decoded.set(key, (body_hash, body))
+        return body
@@ -0,0 +1,88 @@
+from cache_utils import CacheStats, LRUCache
+from moltin_api import (
+    get_product_main_image_url,
+    get_product_main_image_urls
+)
+
+_image_url_cache = None
+
+
+class ImageUrlCache:
+
+    def __init__(self, redis_connection=None, redis_key='image_urls',
+                 ttl=7 * 24 * 3600, maxsize=2048):
+        self.redis = redis_connection
+        self.redis_key = redis_key
+        self.ttl = ttl
+        self.urls = LRUCache(maxsize)
+        self.stats = CacheStats()
+
+    def _save_shared_urls(self, image_urls):
+        if not self.redis or not image_urls:
+            return
+        with self.redis.pipeline() as pipe:
+            pipe.hset(self.redis_key, mapping=image_urls)
+            pipe.expire(self.redis_key, self.ttl)
+            pipe.execute()
+
+    def get_url(self, moltin_token, image_id):
+        if image_url := self.urls.get(image_id):
+            self.stats.hit()
+            return image_url
+        if self.redis and (image_url := self.redis.hget(self.redis_key,
+                                                        image_id)):
+            self.stats.hit()
+            self.urls.set(image_id, image_url)
+            return image_url
+
+        self.stats.miss()
+        image_url = get_product_main_image_url(moltin_token, image_id)
+        self.urls.set(image_id, image_url)
+        self._save_shared_urls({image_id: image_url})
+        return image_url
+
+    def get_urls(self, moltin_token, image_ids):
+        image_urls = {}
+        missing_ids = []
+        for image_id in dict.fromkeys(image_ids):
+            if image_url := self.urls.get(image_id):
+                image_urls[image_id] = image_url
+            else:
+                missing_ids.append(image_id)
+
+        if self.redis and missing_ids:
+            shared_urls = self.redis.hmget(self.redis_key, missing_ids)
+            for image_id, image_url in zip(list(missing_ids), shared_urls):
+                if image_url:
+                    image_urls[image_id] = image_url
+                    self.urls.set(image_id, image_url)
+                    missing_ids.remove(image_id)
+        self.stats.hit(len(image_urls))
+
+        if missing_ids:
+            self.stats.miss(len(missing_ids))
+            fetched_urls = get_product_main_image_urls(moltin_token,
+                                                       missing_ids)
+            for image_id, image_url in fetched_urls.items():
+                self.urls.set(image_id, image_url)
+            self._save_shared_urls(fetched_urls)
+            image_urls.update(fetched_urls)
+        return image_urls
+
+    def invalidate(self, image_id=None):
+        if image_id:
+            self.urls.pop(image_id)
+            if self.redis:
+                self.redis.hdel(self.redis_key, image_id)
+            return
+        self.urls.clear()
+        if self.redis:
+            self.redis.delete(self.redis_key)
+
+
+def get_image_url_cache(redis_connection=None):
+    global _image_url_cache
+
+    if not _image_url_cache:
+        _image_url_cache = ImageUrlCache(redis_connection)
+    return _image_url_cache
@@ -0,0 +1,177 @@
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from environs import Env
+from slugify import slugify
+
+from moltin_api import (
+    add_product_main_image,
+    configure as configure_moltin_client,
+    create_file,
+    create_product,
+    get_access_token,
+    iter_products
+)
+from rate_limiter import RateLimiter
+from redis_db import get_redis_connection
+
+logger = logging.getLogger(__file__)
+
+
+def load_checkpoint(checkpoint_path):
+    if not os.path.exists(checkpoint_path):
+        return {}
+    with open(checkpoint_path, 'r') as file:
+        return json.load(file)
+
+
+def save_checkpoint(checkpoint_path, checkpoint):
+    temp_path = f'{checkpoint_path}.tmp'
+    with open(temp_path, 'w') as file:
+        json.dump(checkpoint, file, ensure_ascii=False, indent=2)
+    os.replace(temp_path, checkpoint_path)
+
+
+def get_existing_products(moltin_token):
+    slugs = set()
+    skus = set()
+    for product in iter_products(moltin_token):
+        slugs.add(product['slug'])
+        skus.add(product['sku'])
+    return slugs, skus
+
+
+def get_pending_products(products, checkpoint, existing_slugs, existing_skus):
+    pending_products = []
+    skipped = 0
+    for product in products:
+        product_key = str(product['id'])
+        progress = checkpoint.get(product_key, {})
+        if progress.get('linked'):
+            skipped += 1
+            continue
+        already_exists = (slugify(product['name']) in existing_slugs or
+                          f'sku-{product["id"]}' in existing_skus)
+        if already_exists and not progress.get('product_id'):
+            skipped += 1
+            continue
+        pending_products.append(product)
+    return pending_products, skipped
+
+
+def load_products(moltin_token, products, checkpoint_path, workers=8):
+    started_at = time.monotonic()
+    checkpoint = load_checkpoint(checkpoint_path)
+    existing_slugs, existing_skus = get_existing_products(moltin_token)
+    pending_products, skipped = get_pending_products(
+        products, checkpoint, existing_slugs, existing_skus
+    )
+    logger.info(f'К загрузке {len(pending_products)} товаров, '
+                f'пропущено {skipped}')
+
+    requests_count = 0
+    loaded = 0
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for product in pending_products:
+            product_key = str(product['id'])
+            progress = checkpoint.setdefault(product_key, {})
+            if not progress.get('image_id'):
+                future = executor.submit(create_file, moltin_token,
+                                         product['product_image']['url'])
+                futures[future] = (product_key, 'image_id')
+            if not progress.get('product_id'):
+                future = executor.submit(create_product, moltin_token,
+                                         product['id'], product['name'],
+                                         product['description'],
+                                         product['price'])
+                futures[future] = (product_key, 'product_id')
+            if progress.get('image_id') and progress.get('product_id'):
+                future = executor.submit(add_product_main_image,
+                                         moltin_token,
+                                         progress['product_id'],
+                                         progress['image_id'])
+                futures[future] = (product_key, 'linked')
+
+        while futures:
+            future = next(as_completed(futures))
+            product_key, step = futures.pop(future)
+            requests_count += 1
+            progress = checkpoint[product_key]
+            try:
+                result = future.result()
+            except Exception as err:
+                failed += 1
+                progress['error'] = str(err)
+                logger.error(f'Товар {product_key}, шаг {step}: {err}')
+                save_checkpoint(checkpoint_path, checkpoint)
+                continue
+
+            if step == 'linked':
+                progress['linked'] = True
+                progress.pop('error', None)
+                loaded += 1
+            else:
+                progress[step] = result['data']['id']
+                if progress.get('image_id') and progress.get('product_id'):
+                    future = executor.submit(add_product_main_image,
+                                             moltin_token,
+                                             progress['product_id'],
+                                             progress['image_id'])
+                    futures[future] = (product_key, 'linked')
+            save_checkpoint(checkpoint_path, checkpoint)
+
+    elapsed = time.monotonic() - started_at
+    logger.info(
+        f'Загружено {loaded} товаров, ошибок {failed}, пропущено {skipped}. '
+        f'{requests_count} запросов за {elapsed:.1f} с '
+        f'({loaded / elapsed:.2f} товаров/с, '
+        f'{requests_count / elapsed:.2f} запросов/с)'
+    )
+    return loaded, failed, skipped
+
+
+def main():
+    env = Env()
+    env.read_env()
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description='Загрузка товаров из JSON файла в ElasticPath'
+    )
+    parser.add_argument('products_path', help='путь к JSON файлу с товарами')
+    parser.add_argument('--checkpoint', default='load_products.progress.json',
+                        help='файл с прогрессом загрузки')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='количество параллельных запросов')
+    args = parser.parse_args()
+
+    client_id = env.str('CLIENT_ID')
+    client_secret = env.str('CLIENT_SECRET')
+    redis_uri = env.str('REDIS_URL')
+    redis_port = env.str('REDIS_PORT')
+    redis_password = env.str('REDIS_PASSWORD')
+    moltin_rate_limit = env.float('MOLTIN_RATE_LIMIT', 20)
+    moltin_rate_burst = env.int('MOLTIN_RATE_BURST', 40)
+
+    redis_connection = get_redis_connection(redis_uri, redis_port,
+                                            redis_password)
+    rate_limiter = RateLimiter(redis_connection, rate=moltin_rate_limit,
+                               capacity=moltin_rate_burst)
+    configure_moltin_client(pool_size=max(args.workers, 10),
+                            rate_limiter=rate_limiter)
+    moltin_token = get_access_token(client_id, client_secret)['access_token']
+
+    with open(args.products_path, 'r') as file:
+        products = json.load(file)
+    load_products(moltin_token, products, args.checkpoint,
+                  workers=args.workers)
+
+
+if __name__ == '__main__':
+    main()
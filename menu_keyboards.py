@@ -0,0 +1,105 @@
+import hashlib
+import json
+import logging
+import threading
+
+from more_itertools import chunked
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from catalog_cache import get_catalog_cache
+
+logger = logging.getLogger(__file__)
+
+_menu_keyboard_cache = None
+
+
+def get_products_menu(products, page):
+    parsed_products = {
+        product['name']: product['id'] for product in products[page - 1]
+    }
+    keyboard = []
+    for button_name, button_id in parsed_products.items():
+        keyboard.append(
+            [InlineKeyboardButton(text=button_name, callback_data=button_id)]
+        )
+    max_page_number = len(products)
+    previous_page_number = page - 1
+    next_page_number = page + 1
+    if page == 1:
+        previous_page_number = max_page_number
+    elif page == max_page_number:
+        next_page_number = 1
+
+    keyboard.append(
+        [
+            InlineKeyboardButton(text='◀',
+                                 callback_data=previous_page_number),
+            InlineKeyboardButton(text='Корзина', callback_data='cart'),
+            InlineKeyboardButton(text='▶',
+                                 callback_data=next_page_number)
+        ]
+    )
+    return InlineKeyboardMarkup(keyboard)
+
+
+def get_menu_fingerprint(products, quantity_per_page):
+    menu_items = [(product['id'], product['name']) for product in products]
+    return hashlib.sha1(
+        json.dumps([quantity_per_page, menu_items]).encode()
+    ).hexdigest()
+
+
+class MenuKeyboardCache:
+
+    def __init__(self, redis_connection=None, redis_key='menu_keyboards',
+                 quantity_per_page=8, ttl=86400):
+        self.redis = redis_connection
+        self.redis_key = redis_key
+        self.quantity_per_page = quantity_per_page
+        self.ttl = ttl
+        self._catalog_version = None
+        self._keyboards = {}
+        self._lock = threading.Lock()
+
+    def _build_keyboards(self, products):
+        products_per_page = list(chunked(products, self.quantity_per_page))
+        return {
+            page: get_products_menu(products_per_page, page).to_json()
+            for page in range(1, len(products_per_page) + 1)
+        }
+
+    def _load_keyboards(self, products):
+        fingerprint = get_menu_fingerprint(products, self.quantity_per_page)
+        redis_key = f'{self.redis_key}:{fingerprint}'
+        if self.redis and (keyboards := self.redis.hgetall(redis_key)):
+            return {
+                int(page): keyboard for page, keyboard in keyboards.items()
+            }
+
+        keyboards = self._build_keyboards(products)
+        if self.redis and keyboards:
+            with self.redis.pipeline() as pipe:
+                pipe.hset(redis_key, mapping=keyboards)
+                pipe.expire(redis_key, self.ttl)
+                pipe.execute()
+        logger.info(f'Клавиатуры меню собраны: {len(keyboards)} страниц')
+        return keyboards
+
+    def get_keyboard(self, moltin_token, page):
+        catalog = get_catalog_cache().get_catalog(moltin_token)
+        if catalog['version'] != self._catalog_version:
+            with self._lock:
+                if catalog['version'] != self._catalog_version:
+                    self._keyboards = self._load_keyboards(
+                        catalog['products']
+                    )
+                    self._catalog_version = catalog['version']
+        return self._keyboards.get(page) or self._keyboards.get(1)
+
+
+def get_menu_keyboard_cache(redis_connection=None):
+    global _menu_keyboard_cache
+
+    if not _menu_keyboard_cache:
+        _menu_keyboard_cache = MenuKeyboardCache(redis_connection)
+    return _menu_keyboard_cache
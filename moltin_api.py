@@ -1,333 +1,593 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
 from slugify import slugify
 
+from rate_limiter import PRIORITY_READ, PRIORITY_WRITE, parse_retry_after
+from single_flight import SingleFlight
+
+MOLTIN_API_URL = 'https://api.moltin.com'
+
+logger = logging.getLogger(__file__)
+
+_default_client = None
+
+
+def get_include_payload(include_main_image):
+    return {'include': 'main_image'} if include_main_image else {}
+
+
+def get_included_main_image_urls(response):
+    included_images = response.get('included', {}).get('main_images', [])
+    return {image['id']: image['link']['href'] for image in included_images}
+
+
+def create_session(pool_size=10):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size,
+                          pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class MoltinClient:
+
+    def __init__(self, access_token=None, pool_size=10, timeout=(3.05, 15),
+                 base_url=MOLTIN_API_URL, session=None, rate_limiter=None,
+                 max_retries=3, response_cache=None, single_flight=None):
+        self.access_token = access_token
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.base_url = base_url.rstrip('/')
+        self.session = session if session else create_session(pool_size)
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.response_cache = response_cache
+        self.single_flight = single_flight if single_flight else SingleFlight()
+
+    def with_token(self, access_token):
+        return MoltinClient(access_token, pool_size=self.pool_size,
+                            timeout=self.timeout, base_url=self.base_url,
+                            session=self.session,
+                            rate_limiter=self.rate_limiter,
+                            max_retries=self.max_retries,
+                            response_cache=self.response_cache,
+                            single_flight=self.single_flight)
+
+    def close(self):
+        self.session.close()
+
+    def request(self, method, path, headers=None, **kwargs):
+        url = path if path.startswith('http') else f'{self.base_url}{path}'
+        request_headers = {}
+        if self.access_token:
+            request_headers['Authorization'] = f'Bearer {self.access_token}'
+        if headers:
+            request_headers.update(headers)
+        kwargs.setdefault('timeout', self.timeout)
+        if not self.rate_limiter:
+            return self.session.request(method, url, headers=request_headers,
+                                        **kwargs)
+
+        priority = (PRIORITY_WRITE if method != 'GET' or '/carts/' in url
+                    else PRIORITY_READ)
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire(priority)
+            response = self.session.request(method, url,
+                                            headers=request_headers, **kwargs)
+            if response.status_code != 429 or attempt == self.max_retries:
+                return response
+            retry_after = parse_retry_after(response)
+            logger.warning(f'Moltin вернул 429, повтор через {retry_after} с')
+            self.rate_limiter.penalize(retry_after)
+        return response
+
+    def get_json(self, path, **kwargs):
+        url = path if path.startswith('http') else f'{self.base_url}{path}'
+        params = kwargs.get('params') or {}
+        headers = kwargs.get('headers') or {}
+        flight_key = (url, self.access_token,
+                      tuple(sorted(params.items())),
+                      tuple(sorted(headers.items())))
+        return self.single_flight.do(flight_key, self._fetch_json, path,
+                                     **kwargs)
+
+    def _fetch_json(self, path, **kwargs):
+        if not self.response_cache or not self.response_cache.is_cacheable(
+                path):
+            response = self.request('GET', path, **kwargs)
+            response.raise_for_status()
+            return response.json()
+
+        url = path if path.startswith('http') else f'{self.base_url}{path}'
+        cache_key = self.response_cache.make_key(url, kwargs.get('params'))
+        cached_response = self.response_cache.get(cache_key)
+        headers = {
+            **self.response_cache.get_validators(cached_response),
+            **(kwargs.pop('headers', None) or {}),
+        }
+        response = self.request('GET', path, headers=headers, **kwargs)
+        if response.status_code == 304 and cached_response:
+            return self.response_cache.load_body(cache_key, cached_response)
+        response.raise_for_status()
+        return self.response_cache.store(cache_key, response)
+
+    def post_json(self, path, **kwargs):
+        response = self.request('POST', path, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def delete(self, path, **kwargs):
+        response = self.request('DELETE', path, **kwargs)
+        return response.ok
+
+    def delete_json(self, path, **kwargs):
+        response = self.request('DELETE', path, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def iter_pages(self, path, params=None, page_limit=100, prefetch=True):
+        payload = {'page[limit]': page_limit, **(params or {})}
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        try:
+            page = self.get_json(path, params=payload)
+            while True:
+                next_page_url = page.get('links', {}).get('next')
+                if not page['data'] or next_page_url in (None, path):
+                    next_page_url = None
+                next_page = None
+                if next_page_url and executor:
+                    next_page = executor.submit(self.get_json, next_page_url)
+                yield page
+                if not next_page_url:
+                    return
+                path = next_page_url
+                page = (next_page.result() if next_page
+                        else self.get_json(next_page_url))
+        finally:
+            if executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def iter_collection(self, path, params=None, page_limit=100,
+                        prefetch=True):
+        for page in self.iter_pages(path, params=params,
+                                    page_limit=page_limit, prefetch=prefetch):
+            yield from page['data']
+
+    def fetch_all_pages(self, path, params=None, page_limit=100,
+                        max_workers=8):
+        started_at = time.monotonic()
+        payload = {'page[limit]': page_limit, **(params or {})}
+        first_page = self.get_json(path, params=payload)
+        page_meta = first_page.get('meta', {}).get('page', {})
+        total_pages = page_meta.get('total', 1)
+        pages = [first_page]
+        if total_pages > 1:
+            offsets = [page_limit * page for page in range(1, total_pages)]
+            with ThreadPoolExecutor(
+                    max_workers=min(max_workers, len(offsets))) as executor:
+                pages += executor.map(
+                    lambda offset: self.get_json(
+                        path, params={**payload, 'page[offset]': offset}
+                    ),
+                    offsets
+                )
+        logger.info(
+            f'{path}: {total_pages} стр. загружено за '
+            f'{time.monotonic() - started_at:.3f} с'
+        )
+        return pages
+
+    def get_access_token(self, client_id, client_secret):
+        payload = {
+            'client_id': client_id,
+            'client_secret': client_secret,
+            'grant_type': 'client_credentials'
+        }
+        return self.post_json('/oauth/access_token', data=payload)
+
+    def get_products(self, include_main_image=False):
+        payload = get_include_payload(include_main_image)
+        return self.get_json('/v2/products', params=payload)
+
+    def get_products_by_category_id(self, category_id,
+                                    include_main_image=False):
+        payload = {
+            'filter': f'eq(category.id, {category_id})',
+            **get_include_payload(include_main_image)
+        }
+        return self.get_json('/v2/products', params=payload)
+
+    def get_products_by_category_slug(self, category_slug,
+                                      include_main_image=False):
+        category = self.get_category_by_slug(category_slug)
+        category_id = category['data'][0]['id']
+        return self.get_products_by_category_id(
+            category_id, include_main_image=include_main_image
+        )
+
+    def iter_product_pages(self, category_id=None, include_main_image=False,
+                           prefetch=True):
+        payload = get_include_payload(include_main_image)
+        if category_id:
+            payload['filter'] = f'eq(category.id, {category_id})'
+        return self.iter_pages('/v2/products', params=payload,
+                               prefetch=prefetch)
+
+    def iter_products(self, prefetch=True):
+        return self.iter_collection('/v2/products', prefetch=prefetch)
+
+    def iter_products_by_category_id(self, category_id, prefetch=True):
+        payload = {
+            'filter': f'eq(category.id, {category_id})',
+        }
+        return self.iter_collection('/v2/products', params=payload,
+                                    prefetch=prefetch)
+
+    def get_product(self, product_id, include_main_image=False):
+        payload = get_include_payload(include_main_image)
+        return self.get_json(f'/v2/products/{product_id}', params=payload)
+
+    def get_product_main_image_url(self, image_id):
+        image = self.get_json(f'/v2/files/{image_id}')
+        return image['data']['link']['href']
+
+    def get_files(self, file_ids):
+        payload = {
+            'filter': f'in(id,{",".join(file_ids)})',
+            'page[limit]': len(file_ids),
+        }
+        return self.get_json('/v2/files', params=payload)
+
+    def get_product_main_image_urls(self, image_ids, batch_size=100):
+        image_ids = list(image_ids)
+        image_urls = {}
+        for start in range(0, len(image_ids), batch_size):
+            files = self.get_files(image_ids[start:start + batch_size])
+            image_urls.update({
+                file['id']: file['link']['href'] for file in files['data']
+            })
+        return image_urls
+
+    def create_product(self, product_id, name, description, price,
+                       slug=None):
+        product_description = {
+            'data': {
+                'type': 'product',
+                'name': name,
+                'slug': slug if slug else slugify(name),
+                'sku': f'sku-{product_id}',
+                'description': description,
+                'manage_stock': False,
+                'price': [
+                    {
+                        'amount': int(price) * 100,
+                        'currency': 'RUB',
+                        'includes_tax': True,
+                    },
+                ],
+                'status': 'live',
+                'commodity_type': 'physical',
+            },
+        }
+        return self.post_json('/v2/products', json=product_description)
+
+    def add_product_main_image(self, product_id, image_id):
+        image_description = {
+            'data': {
+                'type': 'main_image',
+                'id': image_id,
+            },
+        }
+        return self.post_json(
+            f'/v2/products/{product_id}/relationships/main-image',
+            json=image_description
+        )
+
+    def delete_product(self, product_id):
+        return self.delete(f'/v2/products/{product_id}')
+
+    def get_or_create_cart(self, cart_id, currency='RUB'):
+        headers = {'X-MOLTIN-CURRENCY': currency}
+        return self.get_json(f'/v2/carts/{cart_id}', headers=headers)
+
+    def get_cart_items(self, cart_id):
+        return self.get_json(f'/v2/carts/{cart_id}/items')
+
+    def add_cart_item(self, cart_id, item_id, item_quantity,
+                      currency='RUB'):
+        headers = {'X-MOLTIN-CURRENCY': currency}
+        cart_item = {
+            'data': {
+                'id': item_id,
+                'type': 'cart_item',
+                'quantity': item_quantity,
+            },
+        }
+        return self.post_json(f'/v2/carts/{cart_id}/items',
+                              headers=headers, json=cart_item)
+
+    def remove_cart_item(self, cart_id, item_id):
+        return self.delete(f'/v2/carts/{cart_id}/items/{item_id}')
+
+    def delete_cart_item(self, cart_id, item_id):
+        return self.delete_json(f'/v2/carts/{cart_id}/items/{item_id}')
+
+    def delete_cart(self, cart_id):
+        return self.delete(f'/v2/carts/{cart_id}')
+
+    def get_customer(self, customer_id):
+        return self.get_json(f'/v2/customers/{customer_id}')
+
+    def create_customer(self, email, name=None):
+        customer = {
+            'data': {
+                'type': 'customer',
+                'name': name if name else email.split('@')[0],
+                'email': email,
+            },
+        }
+        return self.post_json('/v2/customers', json=customer)
+
+    def create_file(self, file_url):
+        files = {
+            'file_location': (None, file_url),
+        }
+        return self.post_json('/v2/files', files=files)
+
+    def create_flow(self, name, description, slug=None, enabled=True):
+        flow_description = {
+            'data': {
+                'type': 'flow',
+                'name': name,
+                'slug': slug if slug else slugify(name),
+                'description': description,
+                'enabled': enabled,
+            },
+        }
+        return self.post_json('/v2/flows', json=flow_description)
+
+    def create_flow_field(self, flow_id, name, field_type, description,
+                          slug=None, required=True, enabled=True,
+                          default=None):
+        field_description = {
+            'data': {
+                'type': 'field',
+                'name': name,
+                'slug': slug if slug else slugify(name),
+                'field_type': field_type,
+                'description': description,
+                'required': required,
+                'enabled': enabled,
+                'relationships': {
+                    'flow': {
+                        'data': {
+                            'type': 'flow',
+                            'id': flow_id,
+                        },
+                    },
+                },
+            },
+        }
+        if default:
+            field_description['data'].update({'default': default})
+        return self.post_json('/v2/fields', json=field_description)
+
+    def create_flow_entry(self, flow_slug, fields_slug_per_value: dict):
+        entry_description = {
+            'data': {
+                'type': 'entry',
+                **fields_slug_per_value
+            }
+        }
+        return self.post_json(f'/v2/flows/{flow_slug}/entries',
+                              json=entry_description)
+
+    def get_entries(self, flow_slug, next_page_url=None):
+        path = (next_page_url if next_page_url
+                else f'/v2/flows/{flow_slug}/entries')
+        payload = {
+            'page[limit]': 100,
+        }
+        return self.get_json(path, params=payload)
+
+    def iter_entries(self, flow_slug, prefetch=True):
+        return self.iter_collection(f'/v2/flows/{flow_slug}/entries',
+                                    prefetch=prefetch)
+
+    def get_available_entries(self, flow_slug, max_workers=None):
+        if not max_workers:
+            return list(self.iter_entries(flow_slug))
+        pages = self.fetch_all_pages(f'/v2/flows/{flow_slug}/entries',
+                                     max_workers=max_workers)
+        return [entry for page in pages for entry in page['data']]
+
+    def get_categories(self):
+        return self.get_json('/v2/categories')
+
+    def iter_categories(self, prefetch=True):
+        return self.iter_collection('/v2/categories', prefetch=prefetch)
+
+    def get_category_by_slug(self, category_slug):
+        payload = {
+            'filter': f'eq(slug, {category_slug})'
+        }
+        return self.get_json('/v2/categories', params=payload)
+
+
+def configure(**client_options):
+    global _default_client
+
+    if _default_client:
+        _default_client.close()
+    _default_client = MoltinClient(**client_options)
+    return _default_client
+
+
+def get_client(access_token=None):
+    global _default_client
+
+    if not _default_client:
+        _default_client = MoltinClient()
+    if not access_token:
+        return _default_client
+    return _default_client.with_token(access_token)
+
 
 def get_access_token(client_id, client_secret):
-    url = 'https://api.moltin.com/oauth/access_token'
-    payload = {
-        'client_id': client_id,
-        'client_secret': client_secret,
-        'grant_type': 'client_credentials'
-    }
-    response = requests.post(url, data=payload)
-    response.raise_for_status()
-    return response.json()
-
-
-def get_products(access_token):
-    url = 'https://api.moltin.com/v2/products'
-    headers = {
-        'Authorization': f'Bearer {access_token}',
-    }
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    return response.json()
-
-
-def get_products_by_category_id(access_token, category_id):
-    url = 'https://api.moltin.com/v2/products'
-    headers = {
-        'Authorization': f'Bearer {access_token}',
-    }
-    payload = {
-        'filter': f'eq(category.id, {category_id})'
-    }
-    response = requests.get(url, headers=headers, params=payload)
-    response.raise_for_status()
-    return response.json()
-
-
-def get_products_by_category_slug(access_token, category_slug):
-    category = get_category_by_slug(access_token, category_slug)
-    category_id = category['data'][0]['id']
-    products_by_category = get_products_by_category_id(access_token,
-                                                       category_id)
-    return products_by_category
-
-
-def get_product(access_token, product_id):
-    url = f'https://api.moltin.com/v2/products/{product_id}'
-    headers = {
-        'Authorization': f'Bearer {access_token}',
-    }
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    return response.json()
+    return get_client().get_access_token(client_id, client_secret)
+
+
+def get_products(access_token, include_main_image=False):
+    return get_client(access_token).get_products(
+        include_main_image=include_main_image
+    )
+
+
+def get_products_by_category_id(access_token, category_id,
+                                include_main_image=False):
+    return get_client(access_token).get_products_by_category_id(
+        category_id, include_main_image=include_main_image
+    )
+
+
+def get_products_by_category_slug(access_token, category_slug,
+                                  include_main_image=False):
+    return get_client(access_token).get_products_by_category_slug(
+        category_slug, include_main_image=include_main_image
+    )
+
+
+def iter_product_pages(access_token, category_id=None,
+                       include_main_image=False):
+    return get_client(access_token).iter_product_pages(
+        category_id=category_id, include_main_image=include_main_image
+    )
+
+
+def iter_products(access_token):
+    return get_client(access_token).iter_products()
+
+
+def iter_products_by_category_id(access_token, category_id):
+    return get_client(access_token).iter_products_by_category_id(category_id)
+
+
+def get_product(access_token, product_id, include_main_image=False):
+    return get_client(access_token).get_product(
+        product_id, include_main_image=include_main_image
+    )
 
 
 def get_product_main_image_url(access_token, image_id):
-    url = f'https://api.moltin.com/v2/files/{image_id}'
-    headers = {
-        'Authorization': f'Bearer {access_token}'
-    }
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    return response.json()['data']['link']['href']
+    return get_client(access_token).get_product_main_image_url(image_id)
+
+
+def get_product_main_image_urls(access_token, image_ids):
+    return get_client(access_token).get_product_main_image_urls(image_ids)
 
 
 def create_product(access_token, product_id, name, description,
                    price, slug=None):
-    url = 'https://api.moltin.com/v2/products'
-    headers = {
-        'Authorization': f'Bearer {access_token}',
-    }
-    product_description = {
-        'data': {
-            'type': 'product',
-            'name': name,
-            'slug': slug if slug else slugify(name),
-            'sku': f'sku-{product_id}',
-            'description': description,
-            'manage_stock': False,
-            'price': [
-                {
-                    'amount': int(price) * 100,
-                    'currency': 'RUB',
-                    'includes_tax': True,
-                },
-            ],
-            'status': 'live',
-            'commodity_type': 'physical',
-        },
-    }
-    response = requests.post(url, headers=headers, json=product_description)
-    response.raise_for_status()
-    return response.json()
+    return get_client(access_token).create_product(
+        product_id, name, description, price, slug=slug
+    )
 
 
 def add_product_main_image(access_token, product_id, image_id):
-    url = f'https://api.moltin.com/v2/products/{product_id}/relationships/main-image'
-    headers = {
-        'Authorization': f'Bearer {access_token}',
-    }
-    image_description = {
-        'data': {
-            'type': 'main_image',
-            'id': image_id,
-        },
-    }
-    response = requests.post(url, headers=headers, json=image_description)
-    response.raise_for_status()
-    return response.json()
+    return get_client(access_token).add_product_main_image(product_id,
+                                                           image_id)
 
 
 def delete_product(access_token, product_id):
-    url = f'https://api.moltin.com/v2/products/{product_id}'
-    headers = {
-        'Authorization': f'Bearer {access_token}'
-    }
-    response = requests.delete(url, headers=headers)
-    return response.ok
+    return get_client(access_token).delete_product(product_id)
 
 
 def get_or_create_cart(access_token, cart_id, currency='RUB'):
-    url = f'https://api.moltin.com/v2/carts/{cart_id}'
-    headers = {
-        'Authorization': f'Bearer {access_token}',
-        'X-MOLTIN-CURRENCY': currency
-    }
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    return response.json()
+    return get_client(access_token).get_or_create_cart(cart_id,
+                                                       currency=currency)
 
 
 def get_cart_items(access_token, cart_id):
-    url = f'https://api.moltin.com/v2/carts/{cart_id}/items'
-    headers = {
-        'Authorization': f'Bearer {access_token}',
-    }
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    return response.json()
+    return get_client(access_token).get_cart_items(cart_id)
 
 
 def add_cart_item(access_token, cart_id, item_id,
                   item_quantity, currency='RUB'):
-    url = f'https://api.moltin.com/v2/carts/{cart_id}/items'
-    headers = {
-        'Authorization': f'Bearer {access_token}',
-        'X-MOLTIN-CURRENCY': currency
-    }
-    cart_item = {
-        'data': {
-            'id': item_id,
-            'type': 'cart_item',
-            'quantity': item_quantity,
-        },
-    }
-    response = requests.post(url, headers=headers, json=cart_item)
-    response.raise_for_status()
-    return response.json()
+    return get_client(access_token).add_cart_item(
+        cart_id, item_id, item_quantity, currency=currency
+    )
 
 
 def remove_cart_item(access_token, cart_id, item_id):
-    url = f'https://api.moltin.com/v2/carts/{cart_id}/items/{item_id}'
-    headers = {
-        'Authorization': f'Bearer {access_token}'
-    }
-    response = requests.delete(url, headers=headers)
-    return response.ok
+    return get_client(access_token).remove_cart_item(cart_id, item_id)
+
+
+def delete_cart_item(access_token, cart_id, item_id):
+    return get_client(access_token).delete_cart_item(cart_id, item_id)
 
 
 def delete_cart(access_token, cart_id):
-    url = f'https://api.moltin.com/v2/carts/{cart_id}'
-    headers = {
-        'Authorization': f'Bearer {access_token}'
-    }
-    response = requests.delete(url, headers=headers)
-    return response.ok
+    return get_client(access_token).delete_cart(cart_id)
 
 
 def get_customer(access_token, customer_id):
-    url = f'https://api.moltin.com/v2/customers/{customer_id}'
-    headers = {
-        'Authorization': f'Bearer {access_token}',
-    }
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    return response.json()
+    return get_client(access_token).get_customer(customer_id)
 
 
 def create_customer(access_token, email, name=None):
-    url = 'https://api.moltin.com/v2/customers'
-    headers = {
-        'Authorization': f'Bearer {access_token}',
-    }
-    customer = {
-        'data': {
-            'type': 'customer',
-            'name': name if name else email.split('@')[0],
-            'email': email,
-        },
-    }
-    response = requests.post(url, headers=headers, json=customer)
-    response.raise_for_status()
-    return response.json()
+    return get_client(access_token).create_customer(email, name=name)
 
 
 def create_file(access_token, file_url):
-    url = 'https://api.moltin.com/v2/files'
-    headers = {
-        'Authorization': f'Bearer {access_token}',
-    }
-    files = {
-        'file_location': (None, file_url),
-    }
-    response = requests.post(url, headers=headers, files=files)
-    response.raise_for_status()
-    return response.json()
+    return get_client(access_token).create_file(file_url)
 
 
 def create_flow(access_token, name, description, slug=None, enabled=True):
-    url = 'https://api.moltin.com/v2/flows'
-    headers = {
-        'Authorization': f'Bearer {access_token}'
-    }
-    flow_description = {
-        'data': {
-            'type': 'flow',
-            'name': name,
-            'slug': slug if slug else slugify(name),
-            'description': description,
-            'enabled': enabled,
-        },
-    }
-    response = requests.post(url, headers=headers, json=flow_description)
-    response.raise_for_status()
-    return response.json()
+    return get_client(access_token).create_flow(
+        name, description, slug=slug, enabled=enabled
+    )
 
 
 def create_flow_field(access_token, flow_id, name, field_type, description,
                       slug=None, required=True, enabled=True, default=None):
-    url = 'https://api.moltin.com/v2/fields'
-    headers = {
-        'Authorization': f'Bearer {access_token}'
-    }
-    field_description = {
-        'data': {
-            'type': 'field',
-            'name': name,
-            'slug': slug if slug else slugify(name),
-            'field_type': field_type,
-            'description': description,
-            'required': required,
-            'enabled': enabled,
-            'relationships': {
-                'flow': {
-                    'data': {
-                        'type': 'flow',
-                        'id': flow_id,
-                    },
-                },
-            },
-        },
-    }
-    if default:
-        field_description['data'].update({'default': default})
-    response = requests.post(url, headers=headers, json=field_description)
-    response.raise_for_status()
-    return response.json()
+    return get_client(access_token).create_flow_field(
+        flow_id, name, field_type, description, slug=slug,
+        required=required, enabled=enabled, default=default
+    )
 
 
 def create_flow_entry(access_token, flow_slug, fields_slug_per_value: dict):
-    url = f'https://api.moltin.com/v2/flows/{flow_slug}/entries'
-    headers = {
-        'Authorization': f'Bearer {access_token}'
-    }
-    entry_description = {
-        'data': {
-            'type': 'entry',
-            **fields_slug_per_value
-        }
-    }
-    response = requests.post(url, headers=headers, json=entry_description)
-    response.raise_for_status()
-    return response.json()
+    return get_client(access_token).create_flow_entry(flow_slug,
+                                                      fields_slug_per_value)
 
 
 def get_entries(access_token, flow_slug, next_page_url=None):
-    url = (next_page_url if next_page_url
-           else f'https://api.moltin.com/v2/flows/{flow_slug}/entries')
-    headers = {
-        'Authorization': f'Bearer {access_token}'
-    }
-    payload = {
-        'page[limit]': 100,
-    }
-    response = requests.get(url, headers=headers, params=payload)
-    response.raise_for_status()
-    return response.json()
-
-
-def get_available_entries(access_token, flow_slug):
-    available_entries = []
-    entries = get_entries(access_token, flow_slug=flow_slug)
-    available_entries += entries['data']
-    while next_page_url := entries['links']['next']:
-        entries = get_entries(access_token, flow_slug=flow_slug,
-                              next_page_url=next_page_url)
-        available_entries += entries['data']
-    return available_entries
+    return get_client(access_token).get_entries(flow_slug,
+                                                next_page_url=next_page_url)
+
+
+def get_available_entries(access_token, flow_slug, max_workers=None):
+    return get_client(access_token).get_available_entries(
+        flow_slug, max_workers=max_workers
+    )
+
+
+def iter_entries(access_token, flow_slug):
+    return get_client(access_token).iter_entries(flow_slug)
 
 
 def get_categories(access_token):
-    url = 'https://api.moltin.com/v2/categories'
-    headers = {
-        'Authorization': f'Bearer {access_token}'
-    }
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    return response.json()
+    return get_client(access_token).get_categories()
+
+
+def iter_categories(access_token):
+    return get_client(access_token).iter_categories()
 
 
 def get_category_by_slug(access_token, category_slug):
-    url = 'https://api.moltin.com/v2/categories'
-    headers = {
-        'Authorization': f'Bearer {access_token}'
-    }
-    payload = {
-        'filter': f'eq(slug, {category_slug})'
-    }
-    response = requests.get(url, headers=headers, params=payload)
-    response.raise_for_status()
-    return response.json()
+    return get_client(access_token).get_category_by_slug(category_slug)
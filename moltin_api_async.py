@@ -0,0 +1,586 @@
+import asyncio
+import logging
+import time
+
+import aiohttp
+from slugify import slugify
+
+from moltin_api import MOLTIN_API_URL, get_include_payload
+from rate_limiter import PRIORITY_READ, PRIORITY_WRITE, parse_retry_after
+
+logger = logging.getLogger(__file__)
+
+_clients = {}
+_client_options = {}
+
+
+class AsyncMoltinClient:
+
+    def __init__(self, access_token=None, pool_size=100, timeout=15,
+                 base_url=MOLTIN_API_URL, session=None, rate_limiter=None,
+                 max_retries=3):
+        self.access_token = access_token
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.base_url = base_url.rstrip('/')
+        self._session = session
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        await self.close()
+
+    @property
+    def session(self):
+        if not self._session or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                raise_for_status=False,
+            )
+        return self._session
+
+    def with_token(self, access_token):
+        return AsyncMoltinClient(access_token, pool_size=self.pool_size,
+                                 timeout=self.timeout,
+                                 base_url=self.base_url,
+                                 session=self.session,
+                                 rate_limiter=self.rate_limiter,
+                                 max_retries=self.max_retries)
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+    async def request(self, method, path, headers=None, raise_for_status=True,
+                      **kwargs):
+        url = path if path.startswith('http') else f'{self.base_url}{path}'
+        request_headers = {}
+        if self.access_token:
+            request_headers['Authorization'] = f'Bearer {self.access_token}'
+        if headers:
+            request_headers.update(headers)
+        priority = (PRIORITY_WRITE if method != 'GET' or '/carts/' in url
+                    else PRIORITY_READ)
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter:
+                await loop.run_in_executor(None, self.rate_limiter.acquire,
+                                           priority)
+            async with self.session.request(method, url,
+                                            headers=request_headers,
+                                            **kwargs) as response:
+                if (response.status == 429 and self.rate_limiter and
+                        attempt < self.max_retries):
+                    retry_after = parse_retry_after(response)
+                    logger.warning(
+                        f'Moltin вернул 429, повтор через {retry_after} с'
+                    )
+                    await loop.run_in_executor(None,
+                                               self.rate_limiter.penalize,
+                                               retry_after)
+                    continue
+                if not raise_for_status:
+                    return response.ok
+                response.raise_for_status()
+                return await response.json()
+
+    async def get_json(self, path, **kwargs):
+        return await self.request('GET', path, **kwargs)
+
+    async def post_json(self, path, **kwargs):
+        return await self.request('POST', path, **kwargs)
+
+    async def delete(self, path, **kwargs):
+        return await self.request('DELETE', path, raise_for_status=False,
+                                  **kwargs)
+
+    async def delete_json(self, path, **kwargs):
+        return await self.request('DELETE', path, **kwargs)
+
+    async def iter_pages(self, path, params=None, page_limit=100,
+                         prefetch=True):
+        payload = {'page[limit]': page_limit, **(params or {})}
+        next_page = None
+        try:
+            page = await self.get_json(path, params=payload)
+            while True:
+                next_page_url = page.get('links', {}).get('next')
+                if not page['data'] or next_page_url in (None, path):
+                    next_page_url = None
+                next_page = None
+                if next_page_url and prefetch:
+                    next_page = asyncio.ensure_future(
+                        self.get_json(next_page_url)
+                    )
+                yield page
+                if not next_page_url:
+                    return
+                path = next_page_url
+                page = await (next_page if next_page
+                              else self.get_json(next_page_url))
+        finally:
+            if next_page:
+                next_page.cancel()
+
+    async def iter_collection(self, path, params=None, page_limit=100,
+                              prefetch=True):
+        async for page in self.iter_pages(path, params=params,
+                                          page_limit=page_limit,
+                                          prefetch=prefetch):
+            for item in page['data']:
+                yield item
+
+    async def fetch_all_pages(self, path, params=None, page_limit=100,
+                              max_workers=8):
+        started_at = time.monotonic()
+        payload = {'page[limit]': page_limit, **(params or {})}
+        first_page = await self.get_json(path, params=payload)
+        page_meta = first_page.get('meta', {}).get('page', {})
+        total_pages = page_meta.get('total', 1)
+        pages = [first_page]
+        if total_pages > 1:
+            semaphore = asyncio.Semaphore(max_workers)
+
+            async def get_page(offset):
+                async with semaphore:
+                    return await self.get_json(
+                        path, params={**payload, 'page[offset]': offset}
+                    )
+
+            pages += await asyncio.gather(*(
+                get_page(page_limit * page) for page in range(1, total_pages)
+            ))
+        logger.info(
+            f'{path}: {total_pages} стр. загружено за '
+            f'{time.monotonic() - started_at:.3f} с'
+        )
+        return pages
+
+    async def get_access_token(self, client_id, client_secret):
+        payload = {
+            'client_id': client_id,
+            'client_secret': client_secret,
+            'grant_type': 'client_credentials'
+        }
+        return await self.post_json('/oauth/access_token', data=payload)
+
+    async def get_products(self, include_main_image=False):
+        payload = get_include_payload(include_main_image)
+        return await self.get_json('/v2/products', params=payload)
+
+    async def get_products_by_category_id(self, category_id,
+                                          include_main_image=False):
+        payload = {
+            'filter': f'eq(category.id, {category_id})',
+            **get_include_payload(include_main_image)
+        }
+        return await self.get_json('/v2/products', params=payload)
+
+    async def get_products_by_category_slug(self, category_slug,
+                                            include_main_image=False):
+        category = await self.get_category_by_slug(category_slug)
+        category_id = category['data'][0]['id']
+        return await self.get_products_by_category_id(
+            category_id, include_main_image=include_main_image
+        )
+
+    def iter_product_pages(self, category_id=None, include_main_image=False,
+                           prefetch=True):
+        payload = get_include_payload(include_main_image)
+        if category_id:
+            payload['filter'] = f'eq(category.id, {category_id})'
+        return self.iter_pages('/v2/products', params=payload,
+                               prefetch=prefetch)
+
+    def iter_products(self, prefetch=True):
+        return self.iter_collection('/v2/products', prefetch=prefetch)
+
+    def iter_products_by_category_id(self, category_id, prefetch=True):
+        payload = {
+            'filter': f'eq(category.id, {category_id})',
+        }
+        return self.iter_collection('/v2/products', params=payload,
+                                    prefetch=prefetch)
+
+    async def get_product(self, product_id, include_main_image=False):
+        payload = get_include_payload(include_main_image)
+        return await self.get_json(f'/v2/products/{product_id}',
+                                   params=payload)
+
+    async def get_product_main_image_url(self, image_id):
+        image = await self.get_json(f'/v2/files/{image_id}')
+        return image['data']['link']['href']
+
+    async def get_files(self, file_ids):
+        payload = {
+            'filter': f'in(id,{",".join(file_ids)})',
+            'page[limit]': len(file_ids),
+        }
+        return await self.get_json('/v2/files', params=payload)
+
+    async def get_product_main_image_urls(self, image_ids, batch_size=100):
+        image_ids = list(image_ids)
+        batches = await asyncio.gather(*(
+            self.get_files(image_ids[start:start + batch_size])
+            for start in range(0, len(image_ids), batch_size)
+        ))
+        return {
+            file['id']: file['link']['href']
+            for files in batches for file in files['data']
+        }
+
+    async def create_product(self, product_id, name, description, price,
+                             slug=None):
+        product_description = {
+            'data': {
+                'type': 'product',
+                'name': name,
+                'slug': slug if slug else slugify(name),
+                'sku': f'sku-{product_id}',
+                'description': description,
+                'manage_stock': False,
+                'price': [
+                    {
+                        'amount': int(price) * 100,
+                        'currency': 'RUB',
+                        'includes_tax': True,
+                    },
+                ],
+                'status': 'live',
+                'commodity_type': 'physical',
+            },
+        }
+        return await self.post_json('/v2/products', json=product_description)
+
+    async def add_product_main_image(self, product_id, image_id):
+        image_description = {
+            'data': {
+                'type': 'main_image',
+                'id': image_id,
+            },
+        }
+        return await self.post_json(
+            f'/v2/products/{product_id}/relationships/main-image',
+            json=image_description
+        )
+
+    async def delete_product(self, product_id):
+        return await self.delete(f'/v2/products/{product_id}')
+
+    async def get_or_create_cart(self, cart_id, currency='RUB'):
+        headers = {'X-MOLTIN-CURRENCY': currency}
+        return await self.get_json(f'/v2/carts/{cart_id}', headers=headers)
+
+    async def get_cart_items(self, cart_id):
+        return await self.get_json(f'/v2/carts/{cart_id}/items')
+
+    async def add_cart_item(self, cart_id, item_id, item_quantity,
+                            currency='RUB'):
+        headers = {'X-MOLTIN-CURRENCY': currency}
+        cart_item = {
+            'data': {
+                'id': item_id,
+                'type': 'cart_item',
+                'quantity': item_quantity,
+            },
+        }
+        return await self.post_json(f'/v2/carts/{cart_id}/items',
+                                    headers=headers, json=cart_item)
+
+    async def remove_cart_item(self, cart_id, item_id):
+        return await self.delete(f'/v2/carts/{cart_id}/items/{item_id}')
+
+    async def delete_cart_item(self, cart_id, item_id):
+        return await self.delete_json(f'/v2/carts/{cart_id}/items/{item_id}')
+
+    async def delete_cart(self, cart_id):
+        return await self.delete(f'/v2/carts/{cart_id}')
+
+    async def get_customer(self, customer_id):
+        return await self.get_json(f'/v2/customers/{customer_id}')
+
+    async def create_customer(self, email, name=None):
+        customer = {
+            'data': {
+                'type': 'customer',
+                'name': name if name else email.split('@')[0],
+                'email': email,
+            },
+        }
+        return await self.post_json('/v2/customers', json=customer)
+
+    async def create_file(self, file_url):
+        form = aiohttp.FormData()
+        form.add_field('file_location', file_url)
+        return await self.post_json('/v2/files', data=form)
+
+    async def create_flow(self, name, description, slug=None, enabled=True):
+        flow_description = {
+            'data': {
+                'type': 'flow',
+                'name': name,
+                'slug': slug if slug else slugify(name),
+                'description': description,
+                'enabled': enabled,
+            },
+        }
+        return await self.post_json('/v2/flows', json=flow_description)
+
+    async def create_flow_field(self, flow_id, name, field_type, description,
+                                slug=None, required=True, enabled=True,
+                                default=None):
+        field_description = {
+            'data': {
+                'type': 'field',
+                'name': name,
+                'slug': slug if slug else slugify(name),
+                'field_type': field_type,
+                'description': description,
+                'required': required,
+                'enabled': enabled,
+                'relationships': {
+                    'flow': {
+                        'data': {
+                            'type': 'flow',
+                            'id': flow_id,
+                        },
+                    },
+                },
+            },
+        }
+        if default:
+            field_description['data'].update({'default': default})
+        return await self.post_json('/v2/fields', json=field_description)
+
+    async def create_flow_entry(self, flow_slug,
+                                fields_slug_per_value: dict):
+        entry_description = {
+            'data': {
+                'type': 'entry',
+                **fields_slug_per_value
+            }
+        }
+        return await self.post_json(f'/v2/flows/{flow_slug}/entries',
+                                    json=entry_description)
+
+    async def get_entries(self, flow_slug, next_page_url=None):
+        path = (next_page_url if next_page_url
+                else f'/v2/flows/{flow_slug}/entries')
+        payload = {
+            'page[limit]': 100,
+        }
+        return await self.get_json(path, params=payload)
+
+    def iter_entries(self, flow_slug, prefetch=True):
+        return self.iter_collection(f'/v2/flows/{flow_slug}/entries',
+                                    prefetch=prefetch)
+
+    async def get_available_entries(self, flow_slug, max_workers=None):
+        if not max_workers:
+            return [entry async for entry in self.iter_entries(flow_slug)]
+        pages = await self.fetch_all_pages(f'/v2/flows/{flow_slug}/entries',
+                                           max_workers=max_workers)
+        return [entry for page in pages for entry in page['data']]
+
+    async def get_categories(self):
+        return await self.get_json('/v2/categories')
+
+    def iter_categories(self, prefetch=True):
+        return self.iter_collection('/v2/categories', prefetch=prefetch)
+
+    async def get_category_by_slug(self, category_slug):
+        payload = {
+            'filter': f'eq(slug, {category_slug})'
+        }
+        return await self.get_json('/v2/categories', params=payload)
+
+
+def configure(**client_options):
+    _client_options.clear()
+    _client_options.update(client_options)
+
+
+def get_client(access_token=None):
+    loop = asyncio.get_running_loop()
+    if not (client := _clients.get(loop)):
+        client = _clients[loop] = AsyncMoltinClient(**_client_options)
+    if not access_token:
+        return client
+    return client.with_token(access_token)
+
+
+async def close_client():
+    loop = asyncio.get_running_loop()
+    if client := _clients.pop(loop, None):
+        await client.close()
+
+
+async def get_access_token(client_id, client_secret):
+    return await get_client().get_access_token(client_id, client_secret)
+
+
+async def get_products(access_token, include_main_image=False):
+    return await get_client(access_token).get_products(
+        include_main_image=include_main_image
+    )
+
+
+async def get_products_by_category_id(access_token, category_id,
+                                      include_main_image=False):
+    return await get_client(access_token).get_products_by_category_id(
+        category_id, include_main_image=include_main_image
+    )
+
+
+async def get_products_by_category_slug(access_token, category_slug,
+                                        include_main_image=False):
+    return await get_client(access_token).get_products_by_category_slug(
+        category_slug, include_main_image=include_main_image
+    )
+
+
+def iter_product_pages(access_token, category_id=None,
+                       include_main_image=False):
+    return get_client(access_token).iter_product_pages(
+        category_id=category_id, include_main_image=include_main_image
+    )
+
+
+def iter_products(access_token):
+    return get_client(access_token).iter_products()
+
+
+def iter_products_by_category_id(access_token, category_id):
+    return get_client(access_token).iter_products_by_category_id(category_id)
+
+
+async def get_product(access_token, product_id, include_main_image=False):
+    return await get_client(access_token).get_product(
+        product_id, include_main_image=include_main_image
+    )
+
+
+async def get_product_main_image_url(access_token, image_id):
+    return await get_client(access_token).get_product_main_image_url(
+        image_id
+    )
+
+
+async def get_product_main_image_urls(access_token, image_ids):
+    return await get_client(access_token).get_product_main_image_urls(
+        image_ids
+    )
+
+
+async def create_product(access_token, product_id, name, description,
+                         price, slug=None):
+    return await get_client(access_token).create_product(
+        product_id, name, description, price, slug=slug
+    )
+
+
+async def add_product_main_image(access_token, product_id, image_id):
+    return await get_client(access_token).add_product_main_image(
+        product_id, image_id
+    )
+
+
+async def delete_product(access_token, product_id):
+    return await get_client(access_token).delete_product(product_id)
+
+
+async def get_or_create_cart(access_token, cart_id, currency='RUB'):
+    return await get_client(access_token).get_or_create_cart(
+        cart_id, currency=currency
+    )
+
+
+async def get_cart_items(access_token, cart_id):
+    return await get_client(access_token).get_cart_items(cart_id)
+
+
+async def add_cart_item(access_token, cart_id, item_id,
+                        item_quantity, currency='RUB'):
+    return await get_client(access_token).add_cart_item(
+        cart_id, item_id, item_quantity, currency=currency
+    )
+
+
+async def remove_cart_item(access_token, cart_id, item_id):
+    return await get_client(access_token).remove_cart_item(cart_id, item_id)
+
+
+async def delete_cart_item(access_token, cart_id, item_id):
+    return await get_client(access_token).delete_cart_item(cart_id, item_id)
+
+
+async def delete_cart(access_token, cart_id):
+    return await get_client(access_token).delete_cart(cart_id)
+
+
+async def get_customer(access_token, customer_id):
+    return await get_client(access_token).get_customer(customer_id)
+
+
+async def create_customer(access_token, email, name=None):
+    return await get_client(access_token).create_customer(email, name=name)
+
+
+async def create_file(access_token, file_url):
+    return await get_client(access_token).create_file(file_url)
+
+
+async def create_flow(access_token, name, description, slug=None,
+                      enabled=True):
+    return await get_client(access_token).create_flow(
+        name, description, slug=slug, enabled=enabled
+    )
+
+
+async def create_flow_field(access_token, flow_id, name, field_type,
+                            description, slug=None, required=True,
+                            enabled=True, default=None):
+    return await get_client(access_token).create_flow_field(
+        flow_id, name, field_type, description, slug=slug,
+        required=required, enabled=enabled, default=default
+    )
+
+
+async def create_flow_entry(access_token, flow_slug,
+                            fields_slug_per_value: dict):
+    return await get_client(access_token).create_flow_entry(
+        flow_slug, fields_slug_per_value
+    )
+
+
+async def get_entries(access_token, flow_slug, next_page_url=None):
+    return await get_client(access_token).get_entries(
+        flow_slug, next_page_url=next_page_url
+    )
+
+
+async def get_available_entries(access_token, flow_slug, max_workers=None):
+    return await get_client(access_token).get_available_entries(
+        flow_slug, max_workers=max_workers
+    )
+
+
+def iter_entries(access_token, flow_slug):
+    return get_client(access_token).iter_entries(flow_slug)
+
+
+async def get_categories(access_token):
+    return await get_client(access_token).get_categories()
+
+
+def iter_categories(access_token):
+    return get_client(access_token).iter_categories()
+
+
+async def get_category_by_slug(access_token, category_slug):
+    return await get_client(access_token).get_category_by_slug(category_slug)
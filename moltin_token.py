@@ -0,0 +1,98 @@
+import logging
+import threading
+import time
+
+from moltin_api import get_access_token
+
+logger = logging.getLogger(__file__)
+
+_token_manager = None
+
+
+class MoltinTokenManager:
+
+    def __init__(self, client_id, client_secret, redis_connection=None,
+                 redis_key='bot', refresh_margin=300, lock_timeout=30):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.redis = redis_connection
+        self.redis_key = redis_key
+        self.refresh_margin = refresh_margin
+        self.lock_timeout = lock_timeout
+        self._token = None
+        self._expiration = 0
+        self._lock = threading.Lock()
+
+    def _is_fresh(self, now):
+        return self._token and now < self._expiration - self.refresh_margin
+
+    def _is_valid(self, now):
+        return self._token and now < self._expiration
+
+    def _load_shared_token(self):
+        if not self.redis:
+            return
+        token, expiration = self.redis.hmget(self.redis_key, 'moltin_token',
+                                             'token_expiration')
+        if token and expiration and float(expiration) > self._expiration:
+            self._token = token
+            self._expiration = float(expiration)
+
+    def _refresh_token(self):
+        moltin_token = get_access_token(self.client_id, self.client_secret)
+        self._token = moltin_token['access_token']
+        self._expiration = float(moltin_token['expires'])
+        if self.redis:
+            self.redis.hset(
+                self.redis_key,
+                mapping={'moltin_token': self._token,
+                         'token_expiration': moltin_token['expires']}
+            )
+        logger.info('Токен Moltin обновлен')
+
+    def _refresh_shared_token(self):
+        lock = self.redis.lock(f'{self.redis_key}:moltin_token_lock',
+                               timeout=self.lock_timeout)
+        if lock.acquire(blocking=False):
+            try:
+                self._load_shared_token()
+                if not self._is_fresh(time.time()):
+                    self._refresh_token()
+            finally:
+                lock.release()
+            return
+        if self._is_valid(time.time()):
+            return
+        if lock.acquire(blocking=True, blocking_timeout=self.lock_timeout):
+            lock.release()
+        self._load_shared_token()
+        if not self._is_valid(time.time()):
+            self._refresh_token()
+
+    def get_token(self):
+        now = time.time()
+        if self._is_fresh(now):
+            return self._token
+        if not self._lock.acquire(blocking=not self._is_valid(now)):
+            return self._token
+        try:
+            self._load_shared_token()
+            if self._is_fresh(time.time()):
+                return self._token
+            if self.redis:
+                self._refresh_shared_token()
+            else:
+                self._refresh_token()
+            return self._token
+        finally:
+            self._lock.release()
+
+
+def get_token_manager(client_id=None, client_secret=None,
+                      redis_connection=None):
+    global _token_manager
+
+    if not _token_manager:
+        _token_manager = MoltinTokenManager(client_id, client_secret,
+                                            redis_connection)
+    return _token_manager
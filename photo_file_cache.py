@@ -0,0 +1,43 @@
+from cache_utils import CacheStats, LRUCache
+
+_photo_file_cache = None
+
+
+class PhotoFileCache:
+
+    def __init__(self, redis_connection=None, redis_key='tg_photo_file_ids',
+                 maxsize=2048):
+        self.redis = redis_connection
+        self.redis_key = redis_key
+        self.file_ids = LRUCache(maxsize)
+        self.stats = CacheStats()
+
+    def get_file_id(self, image_id):
+        if file_id := self.file_ids.get(image_id):
+            self.stats.hit()
+            return file_id
+        if self.redis and (file_id := self.redis.hget(self.redis_key,
+                                                      image_id)):
+            self.stats.hit()
+            self.file_ids.set(image_id, file_id)
+            return file_id
+        self.stats.miss()
+        return None
+
+    def set_file_id(self, image_id, file_id):
+        self.file_ids.set(image_id, file_id)
+        if self.redis:
+            self.redis.hset(self.redis_key, image_id, file_id)
+
+    def invalidate(self, image_id):
+        self.file_ids.pop(image_id)
+        if self.redis:
+            self.redis.hdel(self.redis_key, image_id)
+
+
+def get_photo_file_cache(redis_connection=None):
+    global _photo_file_cache
+
+    if not _photo_file_cache:
+        _photo_file_cache = PhotoFileCache(redis_connection)
+    return _photo_file_cache
@@ -0,0 +1,119 @@
+import threading
+import time
+
+TOKEN_BUCKET_SCRIPT = '''
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local threshold = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local blocked_until = tonumber(redis.call('GET', KEYS[2]) or '0')
+if blocked_until > now then
+    return {0, tostring(blocked_until - now)}
+end
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1]) or capacity
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+
+local allowed = 0
+local wait = 0
+if tokens >= threshold then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = (threshold - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens),
+           'updated_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return {allowed, tostring(wait)}
+'''
+
+PRIORITY_WRITE = 'write'
+PRIORITY_READ = 'read'
+
+
+class RateLimiter:
+
+    def __init__(self, redis_connection, redis_key='moltin_rate_limit',
+                 rate=20, capacity=40, write_reserve=0.25, max_wait=30):
+        self.redis = redis_connection
+        self.redis_key = redis_key
+        self.rate = rate
+        self.capacity = capacity
+        self.write_reserve = write_reserve
+        self.max_wait = max_wait
+        self._script = redis_connection.register_script(TOKEN_BUCKET_SCRIPT)
+        self._lock = threading.Lock()
+        self.metrics = {
+            'acquired_write': 0,
+            'acquired_read': 0,
+            'delayed': 0,
+            'waited_seconds': 0,
+            'throttled': 0,
+        }
+
+    def _count(self, metric, value=1):
+        with self._lock:
+            self.metrics[metric] += value
+
+    def acquire(self, priority=PRIORITY_READ):
+        threshold = 1
+        if priority == PRIORITY_READ:
+            threshold += self.capacity * self.write_reserve
+        started_at = time.monotonic()
+        delayed = False
+        while True:
+            allowed, wait = self._script(
+                keys=[self.redis_key, f'{self.redis_key}:blocked_until'],
+                args=[self.rate, self.capacity, threshold]
+            )
+            if int(allowed):
+                break
+            delayed = True
+            time.sleep(min(float(wait), self.max_wait))
+
+        waited = time.monotonic() - started_at
+        self._count(f'acquired_{priority}')
+        if delayed:
+            self._count('delayed')
+            self._count('waited_seconds', waited)
+        return waited
+
+    def penalize(self, retry_after):
+        self._count('throttled')
+        blocked_until = self.redis.time()
+        blocked_until = blocked_until[0] + blocked_until[1] / 1000000
+        self.redis.set(f'{self.redis_key}:blocked_until',
+                       blocked_until + retry_after,
+                       ex=int(retry_after) + 1)
+
+    def get_metrics(self):
+        tokens, updated_at = self.redis.hmget(self.redis_key, 'tokens',
+                                              'updated_at')
+        tokens = float(tokens) if tokens else self.capacity
+        if updated_at:
+            server_time = self.redis.time()
+            elapsed = server_time[0] + server_time[1] / 1000000 - float(
+                updated_at
+            )
+            tokens = min(self.capacity, tokens + elapsed * self.rate)
+        with self._lock:
+            metrics = dict(self.metrics)
+        metrics.update({
+            'tokens_available': tokens,
+            'capacity': self.capacity,
+            'budget_used': 1 - tokens / self.capacity,
+        })
+        return metrics
+
+
+def parse_retry_after(response, default=1):
+    retry_after = response.headers.get('Retry-After')
+    try:
+        return max(float(retry_after), 0)
+    except (TypeError, ValueError):
+        return default
@@ -1,6 +1,7 @@
 import redis
 
 _database = None
+_binary_database = None
 
 
 def get_redis_connection(redis_uri, redis_port, redis_password):
@@ -17,3 +18,18 @@ def get_redis_connection(redis_uri, redis_port, redis_password):
             return
         _database = connection
     return _database
+
+
+def get_binary_redis_connection(redis_uri, redis_port, redis_password):
+    global _binary_database
+
+    if not _binary_database:
+        connection = redis.Redis(
+            host=redis_uri,
+            port=redis_port,
+            password=redis_password,
+        )
+        if not connection.ping():
+            return
+        _binary_database = connection
+    return _binary_database
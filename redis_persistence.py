@@ -0,0 +1,226 @@
+import argparse
+import hashlib
+import logging
+import pickle
+import threading
+from collections import Counter, defaultdict
+
+from environs import Env
+from telegram.ext import BasePersistence
+
+from cache_utils import LRUCache
+from redis_db import get_binary_redis_connection
+
+logger = logging.getLogger(__file__)
+
+
+def get_digest(raw_data):
+    return hashlib.sha1(raw_data).hexdigest()
+
+
+class RedisPersistence(BasePersistence):
+
+    def __init__(self, redis_connection, redis_key='tg_bot',
+                 user_data_ttl=None, max_cached_digests=100000):
+        super().__init__(store_user_data=True, store_chat_data=False,
+                         store_bot_data=True)
+        self.redis = redis_connection
+        self.redis_key = redis_key
+        self.user_data_ttl = user_data_ttl
+        self._user_data_digests = LRUCache(max_cached_digests)
+        self._bot_data_digests = {}
+        self._bot_data_values = {}
+        self._bot_data_version = None
+        self._held_user_ids = Counter()
+        self._held_user_ids_lock = threading.Lock()
+
+        update_user_data = self.update_user_data
+
+        def update_released_user_data(user_id, data):
+            if not self.is_user_data_held(user_id):
+                update_user_data(user_id, data)
+
+        object.__setattr__(self, 'update_user_data',
+                           update_released_user_data)
+
+    def _get_user_data_key(self, user_id):
+        return f'{self.redis_key}:user_data:{user_id}'
+
+    def hold_user_data(self, user_id):
+        with self._held_user_ids_lock:
+            self._held_user_ids[user_id] += 1
+
+    def release_user_data(self, user_id):
+        with self._held_user_ids_lock:
+            self._held_user_ids[user_id] -= 1
+            if self._held_user_ids[user_id] <= 0:
+                del self._held_user_ids[user_id]
+
+    def is_user_data_held(self, user_id):
+        with self._held_user_ids_lock:
+            return user_id in self._held_user_ids
+
+    def _get_bot_data_version(self):
+        version = self.redis.get(f'{self.redis_key}:bot_data:version')
+        return int(version) if version else 0
+
+    def _load_bot_data_fields(self, bot_data):
+        version = self._get_bot_data_version()
+        stored_fields = self.redis.hgetall(f'{self.redis_key}:bot_data')
+        for field, raw_value in stored_fields.items():
+            key = field.decode()
+            digest = get_digest(raw_value)
+            if self._bot_data_digests.get(key) != digest:
+                value = pickle.loads(raw_value)
+                bot_data[key] = self.insert_bot(value)
+                self._bot_data_digests[key] = digest
+                self._bot_data_values[key] = value
+        stored_keys = {field.decode() for field in stored_fields}
+        for key in list(self._bot_data_digests):
+            if key not in stored_keys:
+                bot_data.pop(key, None)
+                del self._bot_data_digests[key]
+                self._bot_data_values.pop(key, None)
+        self._bot_data_version = version
+
+    def get_user_data(self):
+        return defaultdict(dict)
+
+    def get_chat_data(self):
+        return defaultdict(dict)
+
+    def get_bot_data(self):
+        bot_data = {}
+        self._load_bot_data_fields(bot_data)
+        logger.info(f'Загружены общие данные бота: {len(bot_data)} полей')
+        return bot_data
+
+    def get_conversations(self, name):
+        return {}
+
+    def update_conversation(self, name, key, new_state):
+        pass
+
+    def refresh_user_data(self, user_id, user_data):
+        raw_data = self.redis.get(self._get_user_data_key(user_id))
+        if raw_data is None:
+            return
+        digest = get_digest(raw_data)
+        if self._user_data_digests.get(user_id) == digest:
+            return
+        user_data.clear()
+        user_data.update(self.insert_bot(pickle.loads(raw_data)))
+        self._user_data_digests.set(user_id, digest)
+
+    def refresh_bot_data(self, bot_data):
+        if self._get_bot_data_version() != self._bot_data_version:
+            self._load_bot_data_fields(bot_data)
+
+    def update_user_data(self, user_id, data):
+        raw_data = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        digest = get_digest(raw_data)
+        if self._user_data_digests.get(user_id) == digest:
+            return
+        self.redis.set(self._get_user_data_key(user_id), raw_data,
+                       ex=self.user_data_ttl)
+        self._user_data_digests.set(user_id, digest)
+
+    def update_chat_data(self, chat_id, data):
+        pass
+
+    def update_bot_data(self, data):
+        changed_fields = {}
+        for key, value in data.items():
+            if (key in self._bot_data_values and
+                    self._bot_data_values[key] == value):
+                continue
+            raw_value = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            digest = get_digest(raw_value)
+            if self._bot_data_digests.get(key) == digest:
+                self._bot_data_values[key] = value
+            else:
+                changed_fields[key] = (value, raw_value, digest)
+        deleted_fields = [
+            key for key in self._bot_data_digests if key not in data
+        ]
+        if not changed_fields and not deleted_fields:
+            return
+
+        pipeline = self.redis.pipeline()
+        if changed_fields:
+            pipeline.hset(f'{self.redis_key}:bot_data', mapping={
+                key: raw_value
+                for key, (_, raw_value, _) in changed_fields.items()
+            })
+        if deleted_fields:
+            pipeline.hdel(f'{self.redis_key}:bot_data', *deleted_fields)
+        pipeline.incr(f'{self.redis_key}:bot_data:version')
+        version = pipeline.execute()[-1]
+
+        for key, (value, _, digest) in changed_fields.items():
+            self._bot_data_digests[key] = digest
+            self._bot_data_values[key] = value
+        for key in deleted_fields:
+            self._bot_data_digests.pop(key, None)
+            self._bot_data_values.pop(key, None)
+        if self._bot_data_version == version - 1:
+            self._bot_data_version = version
+
+    def flush(self):
+        pass
+
+
+def import_pickle_persistence(redis_connection, pickle_path,
+                              redis_key='tg_bot', user_data_ttl=None,
+                              overwrite=False):
+    with open(pickle_path, 'rb') as file:
+        stored_data = pickle.load(file)
+    users_data = {
+        user_id: dict(data)
+        for user_id, data in stored_data.get('user_data', {}).items()
+    }
+    customers = (stored_data.get('bot_data') or {}).get('customers') or {}
+    for chat_id, customer_id in customers.items():
+        users_data.setdefault(chat_id, {}).setdefault('customer_id',
+                                                      customer_id)
+
+    imported_count = 0
+    for user_id, data in users_data.items():
+        raw_data = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        if redis_connection.set(f'{redis_key}:user_data:{user_id}',
+                                raw_data, ex=user_data_ttl,
+                                nx=not overwrite):
+            imported_count += 1
+    return imported_count, len(users_data)
+
+
+def main():
+    env = Env()
+    env.read_env()
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description='Перенос состояния Telegram бота из файла '
+                    'PicklePersistence в Redis'
+    )
+    parser.add_argument('pickle_path', nargs='?', default='tg_bot.pickle',
+                        help='файл состояния бота')
+    parser.add_argument('--overwrite', action='store_true',
+                        help='перезаписать данные, которые уже есть в Redis')
+    args = parser.parse_args()
+
+    redis_uri = env.str('REDIS_URL')
+    redis_port = env.str('REDIS_PORT')
+    redis_password = env.str('REDIS_PASSWORD')
+
+    redis_connection = get_binary_redis_connection(redis_uri, redis_port,
+                                                   redis_password)
+    imported_count, users_count = import_pickle_persistence(
+        redis_connection, args.pickle_path, overwrite=args.overwrite
+    )
+    logger.info(f'Перенесены данные {imported_count} из {users_count} '
+                f'пользователей')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+import json
+import logging
+import threading
+import time
+
+from cache_utils import CacheStats, LRUCache
+from moltin_api import get_available_entries
+from restaurant_index import (
+    RestaurantIndex,
+    encode_geohash,
+    get_restaurants_fingerprint
+)
+
+logger = logging.getLogger(__file__)
+
+RESTAURANT_FIELDS = ('id', 'Address', 'Longitude', 'Latitude', 'Tg-id')
+
+_restaurant_directory = None
+
+
+class RestaurantDirectory:
+
+    def __init__(self, redis_connection=None, flow_slug='Pizzeria',
+                 redis_key='restaurants', version_check_interval=30,
+                 geohash_precision=7, nearest_cache_size=65536):
+        self.redis = redis_connection
+        self.flow_slug = flow_slug
+        self.redis_key = redis_key
+        self.version_check_interval = version_check_interval
+        self.geohash_precision = geohash_precision
+        self.nearest_cache = LRUCache(nearest_cache_size)
+        self.nearest_cache_stats = CacheStats()
+        self.version = None
+        self.index = RestaurantIndex([])
+        self._version_checked_at = 0
+        self._lock = threading.Lock()
+        self._stop_refresh = threading.Event()
+
+    def _set_restaurants(self, restaurants, version):
+        self.index = RestaurantIndex(restaurants)
+        self.version = version
+        self.nearest_cache.clear()
+        self._version_checked_at = time.time()
+
+    def _load_shared_restaurants(self):
+        if not self.redis:
+            return False
+        version, restaurants = self.redis.hmget(self.redis_key, 'version',
+                                                'restaurants')
+        if not version or not restaurants:
+            return False
+        if version != self.version:
+            self._set_restaurants(json.loads(restaurants), version)
+            logger.info(f'Загружен список ресторанов, версия {version}')
+        return True
+
+    def refresh(self, moltin_token):
+        entries = get_available_entries(moltin_token, self.flow_slug,
+                                        max_workers=8)
+        restaurants = [
+            {field: entry[field] for field in RESTAURANT_FIELDS}
+            for entry in entries
+        ]
+        fingerprint = get_restaurants_fingerprint(restaurants)
+        with self._lock:
+            if fingerprint == self.index.fingerprint and self.version:
+                return
+            if not self.redis:
+                self._set_restaurants(restaurants, fingerprint)
+                return
+            shared_fingerprint = self.redis.hget(self.redis_key,
+                                                 'fingerprint')
+            if shared_fingerprint == fingerprint:
+                self._load_shared_restaurants()
+                return
+            version = str(self.redis.incr(f'{self.redis_key}:version'))
+            self.redis.hset(self.redis_key, mapping={
+                'version': version,
+                'fingerprint': fingerprint,
+                'restaurants': json.dumps(restaurants, ensure_ascii=False),
+            })
+            self._set_restaurants(restaurants, version)
+            logger.info(f'Список ресторанов обновлен, версия {version}')
+
+    def load(self, moltin_token):
+        with self._lock:
+            loaded = self._load_shared_restaurants()
+        if not loaded:
+            self.refresh(moltin_token)
+
+    def sync(self):
+        now = time.time()
+        if now - self._version_checked_at < self.version_check_interval:
+            return
+        self._version_checked_at = now
+        if self.redis and self.redis.hget(self.redis_key,
+                                          'version') != self.version:
+            with self._lock:
+                self._load_shared_restaurants()
+
+    def get_nearest_restaurants(self, order_coordinates, k=1):
+        self.sync()
+        return self.index.nearest(order_coordinates, k=k)
+
+    def get_nearest_restaurant(self, order_coordinates):
+        self.sync()
+        index = self.index
+        order_lon, order_lat = map(float, order_coordinates)
+        cell = encode_geohash(order_lat, order_lon, self.geohash_precision)
+        cache_key = (index.fingerprint, cell)
+        restaurant_id = self.nearest_cache.get(cache_key)
+        if restaurant_id in index.positions:
+            self.nearest_cache_stats.hit()
+            return index.describe(restaurant_id, order_coordinates)
+
+        self.nearest_cache_stats.miss()
+        nearest_restaurants = index.nearest(order_coordinates)
+        if not nearest_restaurants:
+            return None
+        nearest_restaurant = nearest_restaurants[0]
+        self.nearest_cache.set(cache_key, nearest_restaurant['id'])
+        return nearest_restaurant
+
+    def start_background_refresh(self, get_moltin_token, interval=3600,
+                                 retry_interval=60):
+        def refresh_periodically():
+            while True:
+                wait = interval if self.index else min(interval,
+                                                        retry_interval)
+                if self._stop_refresh.wait(wait):
+                    return
+                try:
+                    self.refresh(get_moltin_token())
+                except Exception as err:
+                    logger.error(f'Не удалось обновить рестораны: {err}')
+
+        self._stop_refresh.clear()
+        threading.Thread(target=refresh_periodically, daemon=True).start()
+
+    def stop_background_refresh(self):
+        self._stop_refresh.set()
+
+
+def get_restaurant_directory(redis_connection=None):
+    global _restaurant_directory
+
+    if not _restaurant_directory:
+        _restaurant_directory = RestaurantDirectory(redis_connection)
+    return _restaurant_directory
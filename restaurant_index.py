@@ -0,0 +1,183 @@
+import hashlib
+import math
+from collections import defaultdict
+
+from geopy import distance
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+HAVERSINE_ERROR = 0.005
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2 +
+         math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def encode_geohash(lat, lon, precision=7):
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bits_count = 0
+    is_lon_bit = True
+    while len(geohash) < precision:
+        coordinate, coordinate_range = ((lon, lon_range) if is_lon_bit
+                                        else (lat, lat_range))
+        middle = (coordinate_range[0] + coordinate_range[1]) / 2
+        bits <<= 1
+        if coordinate >= middle:
+            bits |= 1
+            coordinate_range[0] = middle
+        else:
+            coordinate_range[1] = middle
+        is_lon_bit = not is_lon_bit
+        bits_count += 1
+        if bits_count == 5:
+            geohash.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bits_count = 0
+    return ''.join(geohash)
+
+
+def get_restaurants_fingerprint(restaurants):
+    fingerprint = hashlib.sha1()
+    for restaurant in restaurants:
+        fingerprint.update(
+            f'{restaurant["id"]}:{restaurant["Latitude"]}:'
+            f'{restaurant["Longitude"]}:{restaurant["Tg-id"]};'.encode()
+        )
+    return fingerprint.hexdigest()
+
+
+def get_restaurant_description(restaurant, order_distance):
+    return {
+        'address': restaurant['Address'],
+        'lon': restaurant['Longitude'],
+        'lat': restaurant['Latitude'],
+        'id': restaurant['id'],
+        'distance_km': order_distance.kilometers,
+        'distance_m': order_distance.meters,
+        'courier_id': restaurant['Tg-id']
+    }
+
+
+class RestaurantIndex:
+
+    def __init__(self, restaurants, cell_size=0.05):
+        self.cell_size = cell_size
+        self.fingerprint = get_restaurants_fingerprint(restaurants)
+        self.restaurants = []
+        self.positions = {}
+        self.cells = defaultdict(list)
+        for restaurant in restaurants:
+            lat = float(restaurant['Latitude'])
+            lon = float(restaurant['Longitude'])
+            self.positions[restaurant['id']] = len(self.restaurants)
+            self.cells[self._get_cell(lat, lon)].append(len(self.restaurants))
+            self.restaurants.append((lat, lon, restaurant))
+        self.bounds = self._get_bounds()
+
+    def __len__(self):
+        return len(self.restaurants)
+
+    def _get_cell(self, lat, lon):
+        return (math.floor(lat / self.cell_size),
+                math.floor(lon / self.cell_size))
+
+    def _get_bounds(self):
+        if not self.cells:
+            return None
+        rows = [row for row, _ in self.cells]
+        columns = [column for _, column in self.cells]
+        return min(rows), max(rows), min(columns), max(columns)
+
+    def _get_ring_range(self, center):
+        row, column = center
+        min_row, max_row, min_column, max_column = self.bounds
+        first_ring = max(0, min_row - row, row - max_row,
+                         min_column - column, column - max_column)
+        last_ring = max(abs(row - min_row), abs(row - max_row),
+                        abs(column - min_column), abs(column - max_column))
+        return first_ring, last_ring
+
+    def _iter_ring(self, center, ring):
+        row, column = center
+        if ring == 0:
+            yield center
+            return
+        if 8 * ring > len(self.cells):
+            for cell_row, cell_column in self.cells:
+                if max(abs(cell_row - row),
+                       abs(cell_column - column)) == ring:
+                    yield cell_row, cell_column
+            return
+        for offset in range(-ring, ring + 1):
+            yield row - ring, column + offset
+            yield row + ring, column + offset
+        for offset in range(-ring + 1, ring):
+            yield row + offset, column - ring
+            yield row + offset, column + ring
+
+    def _get_lower_bound_km(self, lat, ring):
+        extreme_lat = min(abs(lat) + (ring + 1) * self.cell_size, 89)
+        return (ring * self.cell_size * KM_PER_DEGREE *
+                math.cos(math.radians(extreme_lat)))
+
+    def _find_candidates(self, lat, lon, k):
+        center = self._get_cell(lat, lon)
+        first_ring, last_ring = self._get_ring_range(center)
+        candidates = []
+        for ring in range(first_ring, last_ring + 1):
+            for cell in self._iter_ring(center, ring):
+                for restaurant_index in self.cells.get(cell, ()):
+                    rest_lat, rest_lon, _ = self.restaurants[restaurant_index]
+                    candidates.append(
+                        (haversine_km(lat, lon, rest_lat, rest_lon),
+                         restaurant_index)
+                    )
+            if len(candidates) < k:
+                continue
+            candidates.sort()
+            kth_distance = candidates[k - 1][0] * (1 + HAVERSINE_ERROR)
+            if kth_distance <= self._get_lower_bound_km(lat, ring):
+                break
+        return candidates
+
+    def describe(self, restaurant_id, order_coordinates):
+        order_lon, order_lat = map(float, order_coordinates)
+        rest_lat, rest_lon, restaurant = self.restaurants[
+            self.positions[restaurant_id]
+        ]
+        order_distance = distance.distance((order_lat, order_lon),
+                                           (rest_lat, rest_lon))
+        return get_restaurant_description(restaurant, order_distance)
+
+    def nearest(self, order_coordinates, k=1):
+        if not self.restaurants:
+            return []
+        order_lon, order_lat = map(float, order_coordinates)
+        k = min(k, len(self.restaurants))
+        candidates = sorted(self._find_candidates(order_lat, order_lon, k))
+        max_distance = candidates[k - 1][0] * (1 + 2 * HAVERSINE_ERROR)
+
+        refined = []
+        for haversine_distance, restaurant_index in candidates:
+            if haversine_distance > max_distance:
+                break
+            rest_lat, rest_lon, restaurant = self.restaurants[
+                restaurant_index
+            ]
+            order_distance = distance.distance((order_lat, order_lon),
+                                               (rest_lat, rest_lon))
+            refined.append((order_distance.kilometers, restaurant_index,
+                            order_distance))
+        refined.sort(key=lambda candidate: candidate[:2])
+        return [
+            get_restaurant_description(self.restaurants[restaurant_index][2],
+                                       order_distance)
+            for _, restaurant_index, order_distance in refined[:k]
+        ]
@@ -0,0 +1,49 @@
+import threading
+
+
+class _Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.metrics = {
+            'calls': 0,
+            'executed': 0,
+            'coalesced': 0,
+        }
+
+    def do(self, key, function, *args, **kwargs):
+        with self._lock:
+            self.metrics['calls'] += 1
+            call = self._calls.get(key)
+            is_leader = not call
+            if is_leader:
+                call = self._calls[key] = _Call()
+                self.metrics['executed'] += 1
+            else:
+                self.metrics['coalesced'] += 1
+
+        if not is_leader:
+            call.done.wait()
+            if call.error:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function(*args, **kwargs)
+            return call.result
+        except Exception as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
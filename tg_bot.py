@@ -1,6 +1,5 @@
 import logging
 import re
-from datetime import datetime
 from textwrap import dedent
 
 import requests
@@ -14,21 +13,22 @@ from telegram.ext import (
     MessageHandler,
     CommandHandler,
     Filters,
-    PicklePersistence,
     PreCheckoutQueryHandler
 )
 
+from cart_mirror import get_cart_mirror
+from catalog_cache import get_catalog_cache
+from gazetteer import get_gazetteer, load_gazetteer
+from geocode_cache import get_geocode_cache
+from image_cache import get_image_url_cache
+from http_cache import DiskCacheBackend, RedisCacheBackend, ResponseCache
 from logs_handler import TelegramLogsHandler
+from menu_keyboards import get_menu_keyboard_cache
 from moltin_api import (
-    get_access_token,
-    get_product,
-    get_or_create_cart,
-    add_cart_item,
-    get_cart_items,
-    remove_cart_item,
+    MOLTIN_API_URL,
+    configure as configure_moltin_client,
     create_customer,
     delete_cart,
-    get_available_entries,
     create_flow_entry
 )
 from tg_lib import (
@@ -41,7 +41,14 @@ from tg_lib import (
     generate_payment_payload,
 )
 from moltin_cart_parser import parse_cart
-from coordinate_utils import fetch_coordinates, get_nearest_restaurant
+from photo_file_cache import get_photo_file_cache
+from moltin_token import get_token_manager
+from rate_limiter import RateLimiter
+from redis_db import get_binary_redis_connection, get_redis_connection
+from redis_persistence import RedisPersistence
+from restaurant_directory import get_restaurant_directory
+from tg_dispatch import ChatOrderedExecutor, process_queued_updates
+from coordinate_utils import set_geocoder_url
 
 logger = logging.getLogger(__file__)
 
@@ -62,7 +69,7 @@ def handle_menu(update, context):
     moltin_token = context.bot_data['moltin_token']
 
     if user_reply == 'cart':
-        user_cart = get_cart_items(moltin_token, chat_id)
+        user_cart = get_cart_mirror().get_cart(moltin_token, chat_id)
         cart_description = parse_cart(user_cart)
         send_cart_description(context, cart_description)
         return 'HANDLE_CART'
@@ -75,18 +82,8 @@ def handle_menu(update, context):
 
     context.user_data['product_id'] = user_reply
 
-    product = get_product(moltin_token, user_reply)
-    product_main_image = product['data']['relationships'].get('main_image')
-
-    product_description = {
-        'name': product['data']['name'],
-        'description': product['data']['description'],
-        'price': product['data']['meta']['display_price']['with_tax'][
-            'formatted'
-        ],
-        'image_id': product_main_image['data']['id'] if product_main_image
-        else ''
-    }
+    product_description = get_catalog_cache().get_product(moltin_token,
+                                                          user_reply)
 
     send_product_description(context, product_description)
     return 'HANDLE_DESCRIPTION'
@@ -105,10 +102,8 @@ def handle_description(update, context):
                        page=current_page)
         return 'HANDLE_MENU'
     elif user_reply == 'add':
-        user_cart = get_or_create_cart(moltin_token, chat_id)
         try:
-            add_cart_item(moltin_token, user_cart['data']['id'],
-                          product_id, item_quantity=1)
+            get_cart_mirror().add_item(moltin_token, chat_id, product_id)
         except requests.exceptions.HTTPError:
             context.bot.answer_callback_query(
                 callback_query_id=update.callback_query.id,
@@ -134,8 +129,8 @@ def handle_cart(update, context):
                        page=current_page)
         return 'HANDLE_MENU'
     elif user_reply == 'pay':
-        if (context.bot_data.get('customers') and
-                context.bot_data['customers'].get(chat_id)):
+        get_cart_mirror().reconcile(moltin_token, chat_id)
+        if context.user_data.get('customer_id'):
             message = 'Пришлите нам ваш адрес текстом или геолокацию.'
             context.bot.send_message(text=message,
                                      chat_id=chat_id)
@@ -150,13 +145,13 @@ def handle_cart(update, context):
                                    message_id=message_id)
         return 'WAITING_EMAIL'
 
-    item_removed = remove_cart_item(moltin_token, chat_id, user_reply)
-    if item_removed:
+    user_cart = get_cart_mirror().remove_item(moltin_token, chat_id,
+                                              user_reply)
+    if user_cart is not None:
         context.bot.answer_callback_query(
             callback_query_id=update.callback_query.id,
             text='Товар удален из корзины'
         )
-        user_cart = get_cart_items(moltin_token, chat_id)
         cart_description = parse_cart(user_cart)
         send_cart_description(context, cart_description)
     else:
@@ -168,7 +163,6 @@ def handle_cart(update, context):
 
 
 def handle_email(update, context):
-    chat_id = context.user_data['chat_id']
     user_email = context.user_data['user_reply']
     moltin_token = context.bot_data['moltin_token']
 
@@ -178,12 +172,9 @@ def handle_email(update, context):
         update.message.reply_text(text=message)
         return 'WAITING_EMAIL'
 
-    if not context.bot_data.get('customers'):
-        context.bot_data['customers'] = {}
-
-    if not context.bot_data['customers'].get(chat_id):
+    if not context.user_data.get('customer_id'):
         customer = create_customer(moltin_token, user_email)
-        context.bot_data['customers'][chat_id] = customer['data']['id']
+        context.user_data['customer_id'] = customer['data']['id']
     message = f'''
     Вы ввели эту почту: {user_email}
     
@@ -199,18 +190,35 @@ def handle_location(update, context):
     try:
         coordinates = user_location.longitude, user_location.latitude
     except AttributeError:
-        yandex_api_key = context.bot_data['yandex_api_key']
-        coordinates = fetch_coordinates(user_location, yandex_api_key)
+        gazetteer = get_gazetteer()
+        coordinates = gazetteer.lookup(user_location) if gazetteer else None
+        if not coordinates:
+            yandex_api_key = context.bot_data['yandex_api_key']
+            coordinates = get_geocode_cache().get_coordinates(
+                user_location, yandex_api_key
+            )
     if not coordinates:
         update.message.reply_text(
             text='Не могу распознать этот адрес, повторите попытку.'
         )
         return 'HANDLE_LOCATION'
 
-    available_restaurants = get_available_entries(moltin_token,
-                                                  flow_slug='Pizzeria')
-    nearest_restaurant = get_nearest_restaurant(coordinates,
-                                                available_restaurants)
+    restaurant_directory = get_restaurant_directory()
+    if not len(restaurant_directory.index):
+        try:
+            restaurant_directory.refresh(moltin_token)
+        except requests.exceptions.RequestException as err:
+            logger.error(f'Не удалось загрузить список пиццерий: {err}')
+    nearest_restaurant = restaurant_directory.get_nearest_restaurant(
+        coordinates
+    )
+    if not nearest_restaurant:
+        update.message.reply_text(
+            text='Не удалось найти ближайшую пиццерию, '
+                 'повторите попытку позже.'
+        )
+        return 'HANDLE_LOCATION'
+
     context.user_data.update(
         {
             'nearest_restaurant': nearest_restaurant,
@@ -229,7 +237,7 @@ def handle_delivery(update, context):
     user_reply = context.user_data['user_reply']
     moltin_token = context.bot_data['moltin_token']
 
-    user_cart = get_cart_items(moltin_token, chat_id)
+    user_cart = get_cart_mirror().get_cart(moltin_token, chat_id)
     cart_description = parse_cart(user_cart)
     context.user_data['cart_price'] = cart_description['total_price']
     nearest_restaurant = context.user_data['nearest_restaurant']
@@ -326,6 +334,7 @@ def successful_payment_callback(update, context):
 
     update.message.reply_text('Оплата прошла успешно')
     delete_cart(moltin_token, chat_id)
+    get_cart_mirror().invalidate(chat_id)
 
 
 def handle_users_reply(update, context):
@@ -348,18 +357,7 @@ def handle_users_reply(update, context):
         }
     )
 
-    if (not (token_expiration := context.bot_data.get('token_expiration')) or
-            token_expiration <= datetime.timestamp(datetime.now())):
-        moltin_access_token = get_access_token(
-            context.bot_data['client_id'],
-            context.bot_data['client_secret']
-        )
-        context.bot_data.update(
-            {
-                'moltin_token': moltin_access_token['access_token'],
-                'token_expiration': moltin_access_token['expires'],
-            }
-        )
+    context.bot_data['moltin_token'] = get_token_manager().get_token()
 
     if user_reply == '/start':
         user_state = 'START'
@@ -398,36 +396,118 @@ def main():
     client_secret = env.str('CLIENT_SECRET')
     yandex_api_key = env.str('YANDEX_API_KEY')
     provider_token = env.str('PAYMENT_PROVIDER_TOKEN')
+    redis_uri = env.str('REDIS_URL')
+    redis_port = env.str('REDIS_PORT')
+    redis_password = env.str('REDIS_PASSWORD')
+    moltin_pool_size = env.int('MOLTIN_POOL_SIZE', 10)
+    moltin_timeout = env.float('MOLTIN_TIMEOUT', 15)
+    moltin_rate_limit = env.float('MOLTIN_RATE_LIMIT', 20)
+    moltin_rate_burst = env.int('MOLTIN_RATE_BURST', 40)
+    http_cache_dir = env.str('MOLTIN_HTTP_CACHE_DIR', None)
+    catalog_refresh_interval = env.int('CATALOG_REFRESH_INTERVAL', 600)
+    restaurants_refresh_interval = env.int('RESTAURANTS_REFRESH_INTERVAL',
+                                           3600)
+    nearest_geohash_precision = env.int('NEAREST_GEOHASH_PRECISION', 7)
+    gazetteer_path = env.str('GAZETTEER_PATH', None)
+    dispatch_workers = env.int('TG_DISPATCH_WORKERS', 8)
+    dispatch_queue_size = env.int('TG_DISPATCH_QUEUE_SIZE', 1000)
+    bot_mode = env.str('TG_BOT_MODE', 'polling')
+    worker_shards = env.list('TG_WORKER_SHARDS', [0], subcast=int)
+    stand_in_url = env.str('API_STAND_IN_URL', None)
+    moltin_api_url = stand_in_url if stand_in_url else MOLTIN_API_URL
+    telegram_api_url = (f'{stand_in_url}/bot' if stand_in_url
+                        else 'https://api.telegram.org/bot')
+    if stand_in_url:
+        set_geocoder_url(stand_in_url)
+
+    redis_connection = get_redis_connection(redis_uri, redis_port,
+                                            redis_password)
+    rate_limiter = RateLimiter(redis_connection, rate=moltin_rate_limit,
+                               capacity=moltin_rate_burst)
+    cache_backend = (DiskCacheBackend(http_cache_dir) if http_cache_dir
+                     else RedisCacheBackend(redis_connection))
+    response_cache = ResponseCache(cache_backend)
+    moltin_client = configure_moltin_client(
+        pool_size=moltin_pool_size,
+        timeout=(3.05, moltin_timeout),
+        rate_limiter=rate_limiter,
+        response_cache=response_cache,
+        base_url=moltin_api_url
+    )
+    token_manager = get_token_manager(client_id, client_secret,
+                                      redis_connection)
+    get_image_url_cache(redis_connection)
+    get_cart_mirror(redis_connection)
+    get_geocode_cache(redis_connection)
+    get_menu_keyboard_cache(redis_connection)
+    get_photo_file_cache(redis_connection)
+    if gazetteer_path:
+        load_gazetteer(gazetteer_path)
+    catalog_cache = get_catalog_cache(redis_connection)
+    catalog_cache.start_background_refresh(token_manager.get_token,
+                                           interval=catalog_refresh_interval)
+    restaurant_directory = get_restaurant_directory(redis_connection)
+    restaurant_directory.geohash_precision = nearest_geohash_precision
+    try:
+        restaurant_directory.load(token_manager.get_token())
+    except Exception as err:
+        logger.error(f'Не удалось загрузить список пиццерий: {err}')
+    restaurant_directory.start_background_refresh(
+        token_manager.get_token, interval=restaurants_refresh_interval
+    )
 
-    dev_bot = Bot(token=dev_bot_token)
+    dev_bot = Bot(token=dev_bot_token, base_url=telegram_api_url)
     tg_logger = TelegramLogsHandler(dev_bot, tg_dev_chat_id)
     logger.addHandler(tg_logger)
 
-    persistence = PicklePersistence(filename='tg_bot.pickle')
+    persistence = RedisPersistence(
+        get_binary_redis_connection(redis_uri, redis_port, redis_password)
+    )
 
-    updater = Updater(token=bot_token, persistence=persistence)
+    updater = Updater(token=bot_token, persistence=persistence,
+                      base_url=telegram_api_url)
     logger.info('Бот запущен')
 
+    chat_executor = None
+    if dispatch_workers:
+        chat_executor = ChatOrderedExecutor(dispatch_workers,
+                                            dispatch_queue_size)
+
+    def get_callback(callback):
+        return chat_executor.wrap(callback) if chat_executor else callback
+
     updater.dispatcher.add_handler(
-        CallbackQueryHandler(handle_users_reply)
+        CallbackQueryHandler(get_callback(handle_users_reply))
     )
     updater.dispatcher.add_handler(
-        MessageHandler(Filters.text | Filters.location, handle_users_reply)
+        MessageHandler(Filters.text | Filters.location,
+                       get_callback(handle_users_reply))
     )
     updater.dispatcher.add_handler(
-        CommandHandler('start', handle_users_reply)
+        CommandHandler('start', get_callback(handle_users_reply))
     )
     updater.dispatcher.add_handler(
-        PreCheckoutQueryHandler(precheckout_callback)
+        PreCheckoutQueryHandler(get_callback(precheckout_callback))
     )
     updater.dispatcher.add_handler(
         MessageHandler(Filters.successful_payment,
-                       successful_payment_callback))
+                       get_callback(successful_payment_callback)))
+
+    def log_metrics(context):
+        logger.info(f'Лимит запросов к Moltin: {rate_limiter.get_metrics()}')
+        logger.info(f'HTTP-кеш каталога: {response_cache.stats.as_dict()}')
+        logger.info(f'Объединение запросов к Moltin: '
+                    f'{dict(moltin_client.single_flight.metrics)}')
+        logger.info(f'Кеш геокодера: {get_geocode_cache().get_metrics()}')
+        logger.info(f'Кеш ближайших пиццерий: '
+                    f'{restaurant_directory.nearest_cache_stats.as_dict()}')
+        if chat_executor:
+            logger.info(f'Очередь обработки: {chat_executor.get_metrics()}')
+
+    updater.job_queue.run_repeating(log_metrics, interval=300)
 
     updater.dispatcher.bot_data.update(
         {
-            'client_id': client_id,
-            'client_secret': client_secret,
             'yandex_api_key': yandex_api_key,
             'provider_token': provider_token
         }
@@ -439,10 +519,20 @@ def main():
     )
 
     try:
-        updater.start_polling()
-        updater.idle()
+        if bot_mode == 'worker':
+            updater.job_queue.start()
+            process_queued_updates(updater.dispatcher, redis_connection,
+                                   worker_shards)
+        else:
+            updater.start_polling()
+            updater.idle()
+    except KeyboardInterrupt:
+        updater.job_queue.stop()
     except Exception as err:
         logger.error(err)
+    finally:
+        if chat_executor:
+            chat_executor.shutdown()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,162 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from telegram import Update
+
+logger = logging.getLogger(__file__)
+
+UPDATES_QUEUE_KEY = 'tg_updates'
+
+
+def get_update_chat_id(update):
+    if chat := update.effective_chat:
+        return chat.id
+    if user := update.effective_user:
+        return user.id
+    return None
+
+
+def get_update_json_chat_id(update_json):
+    if callback_query := update_json.get('callback_query'):
+        if message := callback_query.get('message'):
+            return message['chat']['id']
+        return callback_query['from']['id']
+    for update_object in update_json.values():
+        if not isinstance(update_object, dict):
+            continue
+        if chat := update_object.get('chat'):
+            return chat['id']
+        if user := update_object.get('from'):
+            return user['id']
+    return 0
+
+
+def get_update_shard(chat_id, shard_count):
+    return chat_id % shard_count
+
+
+def get_updates_queue_key(shard):
+    return f'{UPDATES_QUEUE_KEY}:{shard}'
+
+
+def process_queued_updates(dispatcher, redis_connection, shards, timeout=5):
+    queue_keys = [get_updates_queue_key(shard) for shard in shards]
+    logger.info(f'Обработчик читает очереди: {", ".join(queue_keys)}')
+    while True:
+        queued_update = redis_connection.blpop(queue_keys, timeout=timeout)
+        if not queued_update:
+            continue
+        _, raw_update = queued_update
+        try:
+            update = Update.de_json(json.loads(raw_update), dispatcher.bot)
+        except ValueError as err:
+            logger.error(f'Не удалось разобрать обновление: {err}')
+            continue
+        dispatcher.process_update(update)
+
+
+class ChatOrderedExecutor:
+
+    def __init__(self, max_workers=8, max_queue_size=1000):
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='tg_chat')
+        self._queues = {}
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_queue_size)
+        self.metrics = {
+            'submitted': 0,
+            'processed': 0,
+            'failed': 0,
+            'queue_depth': 0,
+            'max_queue_depth': 0,
+            'max_chat_queue_depth': 0,
+            'wait_time_total': 0.0,
+            'max_wait_time': 0.0,
+        }
+
+    def submit(self, chat_id, function, *args):
+        self._slots.acquire()
+        with self._lock:
+            self.metrics['submitted'] += 1
+            self.metrics['queue_depth'] += 1
+            self.metrics['max_queue_depth'] = max(
+                self.metrics['max_queue_depth'], self.metrics['queue_depth']
+            )
+            chat_queue = self._queues.get(chat_id)
+            is_idle = chat_queue is None
+            if is_idle:
+                chat_queue = self._queues[chat_id] = deque()
+            chat_queue.append((time.monotonic(), function, args))
+            self.metrics['max_chat_queue_depth'] = max(
+                self.metrics['max_chat_queue_depth'], len(chat_queue)
+            )
+        if is_idle:
+            self._executor.submit(self._drain, chat_id)
+
+    def _drain(self, chat_id):
+        while True:
+            with self._lock:
+                chat_queue = self._queues[chat_id]
+                if not chat_queue:
+                    del self._queues[chat_id]
+                    return
+                submitted_at, function, args = chat_queue.popleft()
+                wait_time = time.monotonic() - submitted_at
+                self.metrics['queue_depth'] -= 1
+                self.metrics['wait_time_total'] += wait_time
+                self.metrics['max_wait_time'] = max(
+                    self.metrics['max_wait_time'], wait_time
+                )
+            self._slots.release()
+            try:
+                function(*args)
+            except Exception as err:
+                logger.error(f'Ошибка обработки сообщения чата {chat_id}: '
+                             f'{err}')
+                self._count('failed')
+            else:
+                self._count('processed')
+
+    def _count(self, metric):
+        with self._lock:
+            self.metrics[metric] += 1
+
+    def get_chat_queue_depth(self, chat_id):
+        with self._lock:
+            return len(self._queues.get(chat_id, ()))
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self.metrics)
+            metrics['active_chats'] = len(self._queues)
+        started = metrics['submitted'] - metrics['queue_depth']
+        metrics['average_wait_time'] = (
+            metrics['wait_time_total'] / started if started else 0.0
+        )
+        return metrics
+
+    def wrap(self, callback):
+        def run_callback(update, context):
+            try:
+                callback(update, context)
+            finally:
+                if user := update.effective_user:
+                    context.dispatcher.persistence.release_user_data(user.id)
+                context.dispatcher.update_persistence(update)
+
+        def submit_update(update, context):
+            if user := update.effective_user:
+                context.dispatcher.persistence.hold_user_data(user.id)
+            self.submit(get_update_chat_id(update), run_callback, update,
+                        context)
+
+        return submit_update
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -1,26 +1,22 @@
 from textwrap import dedent
 
-from more_itertools import chunked
 from telegram import (
     InlineKeyboardButton,
     InlineKeyboardMarkup,
     ParseMode,
     LabeledPrice
 )
+from telegram.error import BadRequest
 from telegram.utils.helpers import escape_markdown
 
-from moltin_api import (
-    get_product_main_image_url,
-    get_products
-)
-
+from coordinate_utils import get_delivery_band
+from image_cache import get_image_url_cache
+from menu_keyboards import get_menu_keyboard_cache
+from photo_file_cache import get_photo_file_cache
 
-def send_main_menu(context, chat_id, message_id, moltin_token, page,
-                   quantity_per_page=8):
-    products = get_products(moltin_token)['data']
-    products_per_page = list(chunked(products, quantity_per_page))
 
-    reply_markup = get_products_menu(products_per_page, page)
+def send_main_menu(context, chat_id, message_id, moltin_token, page):
+    reply_markup = get_menu_keyboard_cache().get_keyboard(moltin_token, page)
     context.bot.send_message(text='Пожалуйста, выберите товар:',
                              chat_id=chat_id,
                              reply_markup=reply_markup)
@@ -28,35 +24,6 @@ def send_main_menu(context, chat_id, message_id, moltin_token, page,
                                message_id=message_id)
 
 
-def get_products_menu(products, page):
-    parsed_products = {
-        product['name']: product['id'] for product in products[page - 1]
-    }
-    keyboard = []
-    for button_name, button_id in parsed_products.items():
-        keyboard.append(
-            [InlineKeyboardButton(text=button_name, callback_data=button_id)]
-        )
-    max_page_number = len(products)
-    previous_page_number = page - 1
-    next_page_number = page + 1
-    if page == 1:
-        previous_page_number = max_page_number
-    elif page == max_page_number:
-        next_page_number = 1
-
-    keyboard.append(
-        [
-            InlineKeyboardButton(text='◀',
-                                 callback_data=previous_page_number),
-            InlineKeyboardButton(text='Корзина', callback_data='cart'),
-            InlineKeyboardButton(text='▶',
-                                 callback_data=next_page_number)
-        ]
-    )
-    return InlineKeyboardMarkup(keyboard)
-
-
 def send_cart_description(context, cart_description, with_keyboard=True,
                           chat_id=None):
     cart_items = cart_description['cart_description']
@@ -131,13 +98,30 @@ def send_product_description(context, product_description):
         context.bot.send_chat_action(chat_id=chat_id,
                                      action='typing')
 
-        moltin_token = context.bot_data['moltin_token']
-        img_url = get_product_main_image_url(moltin_token, image_id)
-
-        context.bot.send_photo(chat_id=chat_id,
-                               photo=img_url,
-                               caption=dedent(message),
-                               reply_markup=reply_markup)
+        photo_file_cache = get_photo_file_cache()
+        photo_message = None
+        if file_id := photo_file_cache.get_file_id(image_id):
+            try:
+                photo_message = context.bot.send_photo(
+                    chat_id=chat_id,
+                    photo=file_id,
+                    caption=dedent(message),
+                    reply_markup=reply_markup
+                )
+            except BadRequest:
+                photo_file_cache.invalidate(image_id)
+
+        if not photo_message:
+            moltin_token = context.bot_data['moltin_token']
+            img_url = (product_description.get('image_url') or
+                       get_image_url_cache().get_url(moltin_token, image_id))
+
+            photo_message = context.bot.send_photo(chat_id=chat_id,
+                                                   photo=img_url,
+                                                   caption=dedent(message),
+                                                   reply_markup=reply_markup)
+            photo_file_cache.set_file_id(image_id,
+                                         photo_message.photo[-1].file_id)
         context.bot.delete_message(chat_id=chat_id,
                                    message_id=message_id)
     else:
@@ -149,7 +133,8 @@ def send_product_description(context, product_description):
 
 def send_delivery_option(update, restaurant):
     distance = restaurant["distance_km"]
-    if distance < 0.5:
+    delivery_band = get_delivery_band(distance)
+    if delivery_band == 'nearby':
         delivery = True
         message = f'''
         Может, заберете пиццу из нашей пиццерии неподалеку?
@@ -157,13 +142,13 @@ def send_delivery_option(update, restaurant):
         Вот ее адрес: {restaurant['address']}.
         
         А можем и бесплатно доставить, нам не сложно c:'''
-    elif distance < 5:
+    elif delivery_band == 'scooter':
         delivery = True
         message = '''
         Похоже, придется ехать  к вам на самокате.
         Доставка будет стоить 100 руб.
         Доставляем или самовывоз?'''
-    elif distance < 20:
+    elif delivery_band == 'car':
         delivery = True
         message = '''
         Ближайшая пиццерия довольно далеко от вас.
@@ -0,0 +1,61 @@
+import json
+import logging
+
+from environs import Env
+from flask import Flask, request
+from telegram import Bot
+
+from redis_db import get_redis_connection
+from tg_dispatch import (
+    get_update_json_chat_id,
+    get_update_shard,
+    get_updates_queue_key
+)
+
+logger = logging.getLogger(__file__)
+app = Flask(__name__)
+env = Env()
+env.read_env()
+
+
+@app.route('/telegram/<webhook_secret>', methods=['POST'])
+def webhook(webhook_secret):
+    if webhook_secret != env.str('TG_WEBHOOK_SECRET'):
+        return 'Forbidden', 403
+
+    redis_uri = env.str('REDIS_URL')
+    redis_port = env.str('REDIS_PORT')
+    redis_password = env.str('REDIS_PASSWORD')
+    redis_connection = get_redis_connection(redis_uri, redis_port,
+                                            redis_password)
+    shard_count = env.int('TG_SHARD_COUNT', 1)
+
+    update_json = request.get_json(force=True)
+    shard = get_update_shard(get_update_json_chat_id(update_json),
+                             shard_count)
+    redis_connection.rpush(get_updates_queue_key(shard),
+                           json.dumps(update_json, ensure_ascii=False))
+    return 'ok', 200
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+
+    bot_token = env.str('TG_BOT_TOKEN')
+    webhook_url = env.str('TG_WEBHOOK_URL')
+    webhook_secret = env.str('TG_WEBHOOK_SECRET')
+    webhook_host = env.str('TG_WEBHOOK_HOST', '127.0.0.1')
+    webhook_port = env.int('TG_WEBHOOK_PORT', 5000)
+    stand_in_url = env.str('API_STAND_IN_URL', None)
+    telegram_api_url = (f'{stand_in_url}/bot' if stand_in_url
+                        else 'https://api.telegram.org/bot')
+
+    bot = Bot(token=bot_token, base_url=telegram_api_url)
+    bot.set_webhook(url=f'{webhook_url}/telegram/{webhook_secret}')
+
+    logger.info('Вебхук Telegram бота запущен')
+    app.run(host=webhook_host, port=webhook_port)
+
+
+if __name__ == '__main__':
+    main()
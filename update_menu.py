@@ -1,14 +1,23 @@
+import asyncio
 import json
 import logging
 
 from environs import Env
 
+from catalog_cache import get_catalog_cache
+from image_cache import get_image_url_cache
 from moltin_api import (
+    configure as configure_moltin_client,
     get_access_token,
+    get_included_main_image_urls
+)
+from moltin_api_async import (
+    close_client,
+    configure as configure_async_moltin_client,
     get_categories,
-    get_products_by_category_slug,
-    get_product_main_image_url
+    get_products_by_category_id
 )
+from rate_limiter import RateLimiter
 from redis_db import get_redis_connection
 
 logger = logging.getLogger(__file__)
@@ -38,7 +47,7 @@ def get_main_menu_element():
     return element
 
 
-def get_last_menu_element(moltin_token, total_category_slug):
+def get_last_menu_element(categories, total_category_slug):
     image_url = 'https://primepizza.ru/uploads/position/large_0c07c6fd5c4dcadddaf4a2f1a2c218760b20c396.jpg'
     element = {
         "title": "Не нашли нужную пиццу?",
@@ -46,7 +55,6 @@ def get_last_menu_element(moltin_token, total_category_slug):
         "image_url": image_url,
         "buttons": []
     }
-    categories = get_categories(moltin_token)['data']
     buttons = (
         (category['name'], category['slug']) for category in categories
         if category['slug'] != total_category_slug
@@ -62,12 +70,9 @@ def get_last_menu_element(moltin_token, total_category_slug):
     return element
 
 
-def get_products_menu_elements(moltin_token, category_slug,
-                               product_per_page=5):
+def get_products_menu_elements(products, image_urls):
     elements = []
-    products = get_products_by_category_slug(moltin_token,
-                                             category_slug)['data']
-    for product in products[:product_per_page]:
+    for product in products:
         price = product['meta']['display_price']['with_tax']['formatted']
         menu_element = {
             "title": f"{product['name']} ({price} р.)",
@@ -80,9 +85,9 @@ def get_products_menu_elements(moltin_token, category_slug,
                 }
             ]
         }
-        if main_image := product['relationships'].get('main_image'):
-            image_id = main_image['data']['id']
-            image_url = get_product_main_image_url(moltin_token, image_id)
+        main_image = product['relationships'].get('main_image')
+        if main_image and (image_url := image_urls.get(
+                main_image['data']['id'])):
             menu_element.update({
                 "image_url": image_url
             })
@@ -90,16 +95,48 @@ def get_products_menu_elements(moltin_token, category_slug,
     return elements
 
 
-def create_menu(moltin_token):
-    categories = get_categories(moltin_token)['data']
+async def fetch_menu_products(moltin_token, product_per_page=5):
+    try:
+        categories = (await get_categories(moltin_token))['data']
+        categories_products = await asyncio.gather(*(
+            get_products_by_category_id(moltin_token, category['id'],
+                                        include_main_image=True)
+            for category in categories
+        ))
+    finally:
+        await close_client()
+
+    image_urls = {}
+    for products in categories_products:
+        image_urls.update(get_included_main_image_urls(products))
+    return categories, [
+        products['data'][:product_per_page]
+        for products in categories_products
+    ], image_urls
+
+
+def create_menu(moltin_token, image_url_cache):
+    categories, categories_products, image_urls = asyncio.run(
+        fetch_menu_products(moltin_token)
+    )
+    missing_image_ids = [
+        main_image['data']['id']
+        for products in categories_products for product in products
+        if (main_image := product['relationships'].get('main_image'))
+        and main_image['data']['id'] not in image_urls
+    ]
+    if missing_image_ids:
+        image_urls.update(
+            image_url_cache.get_urls(moltin_token, missing_image_ids)
+        )
+
     menu = {}
     main_element = get_main_menu_element()
-    for category in categories:
+    for category, products in zip(categories, categories_products):
         category_slug = category['slug']
         menu_category = f'menu_{category_slug}'
-        products_elements = get_products_menu_elements(moltin_token,
-                                                       category_slug)
-        last_element = get_last_menu_element(moltin_token, category_slug)
+        products_elements = get_products_menu_elements(products, image_urls)
+        last_element = get_last_menu_element(categories, category_slug)
         total_menu = [main_element, *products_elements, last_element]
 
         menu.update({
@@ -109,7 +146,7 @@ def create_menu(moltin_token):
 
 
 def cache_menu(moltin_token, database):
-    menu = create_menu(moltin_token)
+    menu = create_menu(moltin_token, get_image_url_cache(database))
     menu_updated = database.set('menu', json.dumps(menu))
     if menu_updated:
         logger.info('Меню успешно обновлено')
@@ -125,11 +162,18 @@ def main():
     redis_password = env.str('REDIS_PASSWORD')
     client_id = env.str('CLIENT_ID')
     client_secret = env.str('CLIENT_SECRET')
+    moltin_rate_limit = env.float('MOLTIN_RATE_LIMIT', 20)
+    moltin_rate_burst = env.int('MOLTIN_RATE_BURST', 40)
 
-    moltin_token = get_access_token(client_id, client_secret)['access_token']
     redis_connection = get_redis_connection(redis_uri, redis_port,
                                             redis_password)
+    rate_limiter = RateLimiter(redis_connection, rate=moltin_rate_limit,
+                               capacity=moltin_rate_burst)
+    configure_moltin_client(rate_limiter=rate_limiter)
+    configure_async_moltin_client(rate_limiter=rate_limiter)
+    moltin_token = get_access_token(client_id, client_secret)['access_token']
     cache_menu(moltin_token, redis_connection)
+    get_catalog_cache(redis_connection).invalidate()
 
 
 if __name__ == '__main__':